@@ -0,0 +1,4 @@
+"""
+性能测试
+用于对比复制流程各环节的性能
+"""
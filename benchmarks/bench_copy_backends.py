@@ -0,0 +1,81 @@
+"""
+Compare copy backends on files of different sizes
+
+Usage:
+    python -m benchmarks.bench_copy_backends [--sizes 1K 1M 1G] [--dir PATH]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.copy_backend import BACKENDS, DEFAULT_CHUNK_SIZE
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Number of copies per size, so small files are timed over many runs
+TOTAL_BYTES_PER_SIZE = 256 * 1024 ** 2
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes like 1K, 1M, 1G"""
+    text = text.upper()
+    if text[-1] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
+
+
+def make_file(path: str, size: int):
+    """Write a file of random-ish data without holding it all in memory"""
+    block = os.urandom(min(size, 1024 * 1024)) if size else b''
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def bench(backend: str, src_file: str, dst_dir: str, size: int, chunk_size: int) -> Tuple[float, float]:
+    """Copy src_file repeatedly and return (MB/s, files/s)"""
+    copy_file = BACKENDS[backend]
+    runs = max(1, min(1000, TOTAL_BYTES_PER_SIZE // max(size, 1)))
+    start = time.perf_counter()
+    for i in range(runs):
+        copy_file(src_file, os.path.join(dst_dir, f'{backend}_{i}'), chunk_size)
+    elapsed = time.perf_counter() - start
+    return size * runs / elapsed / 1024 ** 2, runs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['1K', '1M', '1G'])
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    parser.add_argument('--chunk-size', type=parse_size, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--dir', help='Directory to run in (defaults to a temp dir)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        print(f"{'size':>6} {'backend':>10} {'MB/s':>10} {'files/s':>10}")
+        for size_text in args.sizes:
+            size = parse_size(size_text)
+            src_file = os.path.join(work_dir, f'src_{size_text}')
+            make_file(src_file, size)
+            for backend in args.backends:
+                dst_dir = os.path.join(work_dir, 'dst')
+                os.makedirs(dst_dir)
+                mb_s, files_s = bench(backend, src_file, dst_dir, size, args.chunk_size)
+                print(f"{size_text:>6} {backend:>10} {mb_s:>10.1f} {files_s:>10.1f}")
+                shutil.rmtree(dst_dir)
+            os.remove(src_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
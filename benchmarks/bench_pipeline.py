@@ -0,0 +1,191 @@
+"""
+Benchmark the scan/filter/copy pipeline of USBCopier.do_copy
+
+Generates reproducible synthetic trees, backs each one up twice (first
+and repeat backup) against a local directory standing in for the drive,
+and reports files/s, MB/s, I/O syscalls per file and peak RSS. Results
+are saved as JSON so runs of different versions can be compared.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--profiles tiny huge] [--scale 0.5]
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import PROFILES, WHITELIST, generate
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Metrics compared by --compare, True when higher is better
+METRICS = {'files_per_s': True, 'mb_per_s': True, 'io_syscalls_per_file': False,
+           'peak_rss_mb': False, 'seconds': False}
+
+
+def read_io_syscalls() -> Optional[int]:
+    """Get the read plus write syscall count of this process (Linux only)"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['syscr']) + int(fields['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_profile(profile: str, scale: float, work_dir: str, settings: Dict[str, Any],
+                verbose: bool) -> Dict[str, Any]:
+    """Generate one tree and back it up twice, in a fresh process"""
+    from src.core.config import config
+    from src.core.logger import logger
+    from src.core.usb_copier import USBCopier
+
+    if not verbose:
+        logger.setLevel(logging.WARNING)
+    src_dir = os.path.join(work_dir, f'src_{profile}')
+    dst_dir = os.path.join(work_dir, f'dst_{profile}')
+    tree = generate(src_dir, profile, scale)
+
+    # Only the in-memory config is changed, the user's config file is untouched
+    config.config = dict(config.config, backup_dst=dst_dir,
+                         white_list=WHITELIST if profile == 'whitelist' else
+                         {'dirname': [], 'filename': [], 'suffix': []})
+    config.config['copy'] = dict(config.copy_settings, **settings)
+
+    copier = USBCopier()
+    # The source is a plain directory, give each profile a fixed device ID
+    copier.get_usb_device_id = lambda drive: f'BENCH-{profile}'
+    result = {'tree': tree}
+    for phase in ('first', 'repeat'):
+        syscalls_before = read_io_syscalls()
+        start = time.perf_counter()
+        ok = copier.do_copy(src_dir)
+        elapsed = time.perf_counter() - start
+        syscalls_after = read_io_syscalls()
+        summary = copier.last_summary or {}
+        result[phase] = {
+            'ok': ok,
+            'seconds': round(elapsed, 4),
+            'files_per_s': round(tree['files'] / elapsed, 1),
+            'mb_per_s': round(summary.get('bytes_done', 0) / elapsed / 1024 ** 2, 2),
+            'files_copied': summary.get('copied', 0) + summary.get('updated', 0),
+            'io_syscalls_per_file': (round((syscalls_after - syscalls_before) / tree['files'], 2)
+                                     if syscalls_before is not None else None),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    return result
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the change of every metric against a baseline result file"""
+    print(f"\nCompared with {baseline.get('version')} ({baseline.get('timestamp')}):")
+    for profile, phases in current['profiles'].items():
+        old_phases = baseline.get('profiles', {}).get(profile)
+        if not old_phases:
+            continue
+        for phase in ('first', 'repeat'):
+            changes = []
+            for metric, higher_is_better in METRICS.items():
+                new, old = phases[phase].get(metric), old_phases[phase].get(metric)
+                if not new or not old:
+                    continue
+                delta = (new - old) / old * 100
+                better = delta > 0 if higher_is_better else delta < 0
+                marker = '' if abs(delta) < 5 else (' (better)' if better else ' (WORSE)')
+                changes.append(f"{metric} {delta:+.1f}%{marker}")
+            print(f"  {profile:>9} {phase:>6}: {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        epilog='Profiles: ' + '; '.join(f'{k} = {v}' for k, v in PROFILES.items()))
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply tree sizes')
+    parser.add_argument('--workers', type=int, help='Override copy.workers')
+    parser.add_argument('--backend', help='Override copy.backend')
+    parser.add_argument('--dir', help='Directory to run in (defaults to a temp dir)')
+    parser.add_argument('--output', help='Result file (defaults to benchmarks/results/)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Keep per-file logging')
+    args = parser.parse_args()
+
+    settings = {}
+    if args.workers:
+        settings['workers'] = args.workers
+    if args.backend:
+        settings['backend'] = args.backend
+
+    results = {
+        'version': git_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'settings': settings,
+        'profiles': {},
+    }
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        print(f"{'profile':>9} {'phase':>6} {'files/s':>10} {'MB/s':>8} {'syscalls/file':>14} "
+              f"{'peak RSS MB':>12}")
+        for profile in args.profiles:
+            # A fresh process per profile keeps peak RSS figures separate
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                result = pool.submit(run_profile, profile, args.scale, work_dir,
+                                     settings, args.verbose).result()
+            results['profiles'][profile] = result
+            for phase in ('first', 'repeat'):
+                r = result[phase]
+                print(f"{profile:>9} {phase:>6} {r['files_per_s']:>10.1f} {r['mb_per_s']:>8.1f} "
+                      f"{r['io_syscalls_per_file'] if r['io_syscalls_per_file'] is not None else 'n/a':>14} "
+                      f"{r['peak_rss_mb'] or 0:>12.1f}")
+            shutil.rmtree(os.path.join(work_dir, f'dst_{profile}'), ignore_errors=True)
+            shutil.rmtree(os.path.join(work_dir, f'src_{profile}'), ignore_errors=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{results['version']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Check import and startup time budgets of the headless entry point
+
+Every measurement runs in a fresh interpreter and is repeated, the best
+run counts. Exits with status 1 when a budget is exceeded or when Qt got
+imported, so it can gate CI.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat 5] [--scale 2.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (code run in the child, budget in milliseconds)
+CHECKS = {
+    # What `usb-backup --help` pays before parsing arguments
+    'import src.cli': ("import src.cli", 60),
+    # What `usb-backup backup` pays before the first file is scanned
+    'import core': ("import src.core.usb_copier, src.core.monitor", 400),
+    # Parser built and help text formatted, without importing the core
+    'cli --help': ("import src.cli\n"
+                   "try:\n"
+                   "    src.cli.main(['--help'])\n"
+                   "except SystemExit:\n"
+                   "    pass", 80),
+}
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+exec(compile({code!r}, '<check>', 'exec'))
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'qt': any(m.startswith('PyQt') for m in sys.modules),
+                  'core': 'src.core.config' in sys.modules}}))
+"""
+
+
+def measure(code: str) -> dict:
+    """Run code in a fresh interpreter and get its time in milliseconds"""
+    out = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, code=code)],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per check, best counts')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiply all budgets, for slow machines')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'check':>16} {'best ms':>9} {'budget':>8}  result")
+    for name, (code, budget) in CHECKS.items():
+        runs = [measure(code) for _ in range(args.repeat)]
+        best = min(run['ms'] for run in runs)
+        limit = budget * args.scale
+        problems = []
+        if best > limit:
+            problems.append('over budget')
+        if any(run['qt'] for run in runs):
+            problems.append('imported Qt')
+        if name != 'import core' and any(run['core'] for run in runs):
+            problems.append('imported the core eagerly')
+        failed = failed or bool(problems)
+        print(f"{name:>16} {best:>9.1f} {limit:>8.0f}  {', '.join(problems) or 'ok'}")
+
+    # Wall time of the whole process, interpreter start included, for reference
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'src.cli', '--help'], cwd=ROOT,
+                   capture_output=True, check=True)
+    print(f"\nProcess start to exit of `-m src.cli --help`: "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
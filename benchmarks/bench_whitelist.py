@@ -0,0 +1,79 @@
+"""
+Measure per-path whitelist cost as the rule lists grow
+
+Usage:
+    python -m benchmarks.bench_whitelist [--rules 1 10 100 500] [--paths 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.whitelist import WhitelistFilter
+
+
+def make_rules(count: int) -> dict:
+    """Build a whitelist with count rules per category, a third of them patterns"""
+    rules = {'dirname': [], 'filename': [], 'suffix': []}
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            rules['dirname'].append(f'dir{i}')
+            rules['filename'].append(f'file{i}.dat')
+            rules['suffix'].append(f'.x{i}')
+        elif kind == 1:
+            rules['dirname'].append(f'cache{i}*')
+            rules['filename'].append(f'tmp{i}_*.log')
+            rules['suffix'].append(f'.y{i}?')
+        else:
+            rules['dirname'].append(f're:build{i}-\\d+')
+            rules['filename'].append(f're:~\\${i}.*')
+            rules['suffix'].append(f're:\\.z{i}[a-c]')
+    return rules
+
+
+def make_names(count: int):
+    rng = random.Random(42)
+    return [f'name{rng.randrange(10 ** 6)}.{rng.choice(["txt", "jpg", "x3", "docx"])}'
+            for _ in range(count)]
+
+
+def naive_skip(white_list: dict, dir_parts, name: str) -> bool:
+    """The per-file check _copy_files used before the compiled filter"""
+    if any(part in white_list['dirname'] for part in dir_parts):
+        return True
+    return (name in white_list['filename'] or
+            os.path.splitext(name)[1].lower() in white_list['suffix'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rules', nargs='+', type=int, default=[1, 10, 100, 500])
+    parser.add_argument('--paths', type=int, default=100000)
+    args = parser.parse_args()
+
+    names = make_names(args.paths)
+    dir_parts = ['DCIM', 'Camera', '2024']
+    print(f"{'rules':>6} {'compiled ns/path':>17} {'naive ns/path':>14}")
+    for count in args.rules:
+        white_list = make_rules(count)
+        whitelist = WhitelistFilter(white_list)
+        start = time.perf_counter()
+        for name in names:
+            for part in dir_parts:
+                whitelist.skip_dir(part)
+            whitelist.skip_file(name)
+        compiled = (time.perf_counter() - start) / len(names) * 1e9
+
+        start = time.perf_counter()
+        for name in names:
+            naive_skip(white_list, dir_parts, name)
+        naive = (time.perf_counter() - start) / len(names) * 1e9
+        print(f"{count:>6} {compiled:>17.0f} {naive:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Reproducible synthetic USB trees for benchmarks
+"""
+import os
+import random
+from typing import Dict, List
+
+# name -> description, used by --help of the benchmarks
+PROFILES = {
+    'tiny': 'many tiny files in a shallow tree',
+    'huge': 'a few huge files',
+    'deep': 'small files spread over deeply nested directories',
+    'whitelist': 'mixed tree where most files hit whitelist rules',
+}
+
+# Whitelist used with the 'whitelist' profile
+WHITELIST = {
+    'dirname': ['node_modules', '.git', 'cache*', 're:build-\\d+'],
+    'filename': ['Thumbs.db', 'desktop.ini', '~$*'],
+    'suffix': ['.tmp', '.iso', 're:\\.bak\\d?'],
+}
+
+
+def _write(path: str, size: int, rng: random.Random):
+    """Write size bytes of incompressible data"""
+    block = rng.randbytes(min(size, 1024 * 1024)) if size else b''
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def generate(root: str, profile: str, scale: float = 1.0, seed: int = 1234) -> Dict[str, int]:
+    """Generate a synthetic tree under root
+
+    The same profile, scale and seed always give the same tree.
+
+    Returns:
+        Dict[str, int]: Number of files and bytes written
+    """
+    rng = random.Random(f'{profile}-{seed}')
+    files: List[tuple] = []
+    if profile == 'tiny':
+        for i in range(int(20000 * scale)):
+            files.append((os.path.join(f'dir{i % 50}', f'file{i}.txt'), rng.randint(0, 4096)))
+    elif profile == 'huge':
+        for i in range(max(1, int(4 * scale))):
+            files.append((os.path.join('videos', f'clip{i}.mp4'), 256 * 1024 * 1024))
+    elif profile == 'deep':
+        for i in range(int(5000 * scale)):
+            depth = rng.randint(5, 30)
+            parts = [f'd{rng.randint(0, 3)}' for _ in range(depth)]
+            files.append((os.path.join(*parts, f'f{i}.dat'), rng.randint(512, 16384)))
+    elif profile == 'whitelist':
+        skipped_dirs = ['node_modules', '.git', 'cache01', 'build-42']
+        skipped_names = ['a{}.tmp', 'b{}.iso', 'c{}.bak1', '~${}.docx']
+        paths = {}
+        for i in range(int(20000 * scale)):
+            roll = rng.random()
+            if roll < 0.5:
+                path = os.path.join(rng.choice(skipped_dirs), f'pkg{i % 200}', f'm{i}.js')
+            elif roll < 0.75:
+                path = os.path.join(f'docs{i % 20}', rng.choice(skipped_names).format(i))
+            elif roll < 0.8:
+                path = os.path.join(f'docs{i % 20}', f'p{i % 500}',
+                                    rng.choice(['Thumbs.db', 'desktop.ini']))
+            else:
+                path = os.path.join(f'docs{i % 20}', f'keep{i}.txt')
+            paths[path] = rng.randint(0, 8192)
+        files.extend(paths.items())
+    else:
+        raise ValueError(f"Unknown profile '{profile}', choose from {', '.join(PROFILES)}")
+
+    total_bytes = 0
+    made_dirs = set()
+    for rel_path, size in files:
+        path = os.path.join(root, rel_path)
+        parent = os.path.dirname(path)
+        if parent not in made_dirs:
+            os.makedirs(parent, exist_ok=True)
+            made_dirs.add(parent)
+        _write(path, size, rng)
+        total_bytes += size
+    # Fixed mtimes keep repeat runs comparable between machines
+    for rel_path, _ in files:
+        os.utime(os.path.join(root, rel_path), (1_600_000_000, 1_600_000_000))
+    return {'files': len(files), 'bytes': total_bytes}
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+USB Backup Tool - Headless Entry Point
+Runs backups from the console without loading Qt, for servers and other
+machines without a desktop.
+
+Usage:
+    python -m src.cli backup <path> [<path> ...]
+    python -m src.cli daemon
+
+Modules are imported inside the commands, so `--help` and argument
+errors return without loading the backup core.
+"""
+import argparse
+import os
+import signal
+import sys
+
+# Add the project root to the path so `src` imports work when run as a script
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+
+def _apply_options(args):
+    """Apply command line overrides to the in-memory configuration"""
+    from src.core.config import config
+    from src.core.logger import configure_logging
+    if args.dst:
+        config.config['backup_dst'] = args.dst
+    if args.verbose:
+        configure_logging(dict(config.log_settings, verbose=True))
+    if args.trace or args.profile:
+        config.config['trace'] = dict(config.trace_settings, enabled=True,
+                                      profiler=args.profile or 'none')
+    return config
+
+
+def _on_stop_signal(stop):
+    """Call stop() on SIGINT/SIGTERM instead of raising inside a copy"""
+    def handler(signum, frame):
+        stop()
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def cmd_backup(args) -> int:
+    """Back up each given path once and exit"""
+    _apply_options(args)
+    from src.core.logger import logger
+    from src.core.usb_copier import USBCopier
+
+    copier = USBCopier()
+    _on_stop_signal(copier.stop_current_copy)
+    exit_code = 0
+    for path in args.paths:
+        if not os.path.isdir(path):
+            logger.error(f"Not a directory: {path}")
+            exit_code = 1
+            continue
+        if not copier.do_copy(path):
+            exit_code = 1
+        elif copier.last_summary and (copier.last_summary['failed'] or
+                                      copier.last_summary['stopped']):
+            exit_code = 1
+        if copier.last_summary and copier.last_summary['stopped']:
+            break
+    return exit_code
+
+
+def cmd_daemon(args) -> int:
+    """Watch for devices and back up each one when it is inserted"""
+    _apply_options(args)
+    import asyncio
+    asyncio.run(_run_daemon())
+    return 0
+
+
+async def _run_daemon():
+    import asyncio
+    from src.core.logger import logger
+    from src.core.monitor import USBMonitor
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    _on_stop_signal(lambda: loop.call_soon_threadsafe(stopped.set))
+    monitor = USBMonitor()
+    watch = asyncio.create_task(monitor.run())
+    logger.info("Backup daemon running, press Ctrl+C to stop")
+    await asyncio.wait([watch, asyncio.create_task(stopped.wait())],
+                       return_when=asyncio.FIRST_COMPLETED)
+    logger.info("Backup daemon stopping")
+    # Cancels the jobs and lets them close their manifests and journals
+    await monitor.shutdown()
+    if watch.done() and not watch.cancelled() and watch.exception():
+        raise watch.exception()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='usb-backup',
+                                     description='Back up USB devices without the tray GUI')
+    parser.add_argument('--dst', help='Backup destination, overrides backup_dst of the config')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every file')
+    parser.add_argument('--trace', action='store_true',
+                        help='Write a Chrome trace of every job and log its phase timings')
+    parser.add_argument('--profile', choices=['cprofile', 'sampling'],
+                        help='Also profile every job, implies --trace')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup = commands.add_parser('backup', help='Back up the given paths once and exit')
+    backup.add_argument('paths', nargs='+', help='Mount point or drive to back up')
+    backup.set_defaults(func=cmd_backup)
+
+    daemon = commands.add_parser('daemon', help='Back up devices as they are inserted')
+    daemon.set_defaults(func=cmd_daemon)
+    return parser
+
+
+def main(argv=None) -> int:
+    """Console entry point"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+import collections
+import os
+import sqlite3
+import tarfile
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from .copy_backend import PART_SUFFIX, CopyStopped
+from .logger import logger
+from .throttle import get_throttle
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_SUFFIX = '.idx'
+DEFAULT_FRAME_SIZE = 4 * 1024 * 1024
+BLOCK_SIZE = tarfile.BLOCKSIZE
+RECORD_SIZE = tarfile.RECORDSIZE
+
+# Archive suffix -> default compression level
+FORMATS = {'tar.zst': 3, 'tar.gz': 6}
+
+
+def get_format(name: str = 'auto') -> str:
+    """Resolve an archive format name, 'auto' prefers zstd when installed"""
+    if name == 'auto':
+        return 'tar.zst' if zstandard is not None else 'tar.gz'
+    if name not in FORMATS:
+        raise ValueError(f"Unknown archive format '{name}', choose from auto, {', '.join(FORMATS)}")
+    if name == 'tar.zst' and zstandard is None:
+        logger.warning("zstandard is not installed, writing tar.gz instead")
+        return 'tar.gz'
+    return name
+
+
+def _compress(fmt: str, level: int, data: bytes) -> bytes:
+    """Compress one frame so it can be decompressed on its own"""
+    if fmt == 'tar.zst':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    # A gzip member per frame, concatenated members are still one valid .gz
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(fmt: str, data: bytes) -> bytes:
+    if fmt == 'tar.zst':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read tar.zst archives")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 31)
+
+
+class FrameWriter:
+    """File-like sink that compresses fixed-size frames in parallel
+
+    The tar stream written to it is cut into frames of frame_size bytes.
+    Every frame is compressed independently by a thread pool (zlib and
+    zstd release the GIL), and written out in order. The offsets of each
+    frame are kept so the index can point into the middle of the archive.
+    """
+    def __init__(self, fileobj: BinaryIO, fmt: str, level: int, workers: int = 4,
+                 frame_size: int = DEFAULT_FRAME_SIZE, initializer=None):
+        self.fileobj = fileobj
+        self.fmt = fmt
+        self.level = level
+        self.frame_size = frame_size
+        self.max_pending = max(1, workers) * 2
+        self.position = 0
+        # (uncompressed offset, compressed offset, compressed size, uncompressed size)
+        self.frames: List[Tuple[int, int, int, int]] = []
+        self._buffer = bytearray()
+        self._flushed = 0
+        self._compressed = 0
+        self._pending = collections.deque()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix='archive',
+                                            initializer=initializer)
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.position += len(data)
+        while len(self._buffer) >= self.frame_size:
+            self._submit(bytes(self._buffer[:self.frame_size]))
+            del self._buffer[:self.frame_size]
+        return len(data)
+
+    def _submit(self, frame: bytes):
+        future = self._executor.submit(_compress, self.fmt, self.level, frame)
+        self._pending.append((future, len(frame)))
+        while len(self._pending) >= self.max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        future, size = self._pending.popleft()
+        data = future.result()
+        throttle = get_throttle()
+        if throttle:
+            throttle.write(len(data))
+        self.fileobj.write(data)
+        self.frames.append((self._flushed, self._compressed, len(data), size))
+        self._flushed += size
+        self._compressed += len(data)
+
+    def truncate(self, position: int):
+        """Drop everything written after position
+
+        Frames already on disk from that point on are cut off; the part of
+        the first one before position is decompressed and buffered again.
+        """
+        while self._pending:
+            self._write_next()
+        if position < self._flushed:
+            index = bisect_right([frame[0] for frame in self.frames], position) - 1
+            offset, compressed_offset, compressed_size, _ = self.frames[index]
+            self.fileobj.flush()
+            with open(self.fileobj.name, 'rb') as f:
+                f.seek(compressed_offset)
+                head = _decompress(self.fmt, f.read(compressed_size))[:position - offset]
+            self.fileobj.seek(compressed_offset)
+            self.fileobj.truncate()
+            del self.frames[index:]
+            self._flushed, self._compressed = offset, compressed_offset
+            self._buffer = bytearray(head)
+        else:
+            del self._buffer[position - self._flushed:]
+        self.position = position
+
+    def close(self):
+        """Compress what is left and wait for all frames"""
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+
+
+class ArchiveWriter:
+    """Stream files into one compressed tar archive plus an index
+
+    The archive is a plain tar.zst or tar.gz that standard tools can
+    unpack. Next to it, ``<archive>.idx`` maps every member to its offset
+    in the uncompressed stream and lists the compressed frames, which lets
+    extract_file read a single file without decompressing the rest.
+    Both files are written under a part name and renamed on close.
+    """
+    def __init__(self, path: str, fmt: str = 'auto', level: Optional[int] = None,
+                 workers: int = 4, frame_size: int = DEFAULT_FRAME_SIZE,
+                 read_size: int = 1024 * 1024, initializer=None, stop_event=None):
+        self.fmt = get_format(fmt)
+        self.path = path
+        self.level = FORMATS[self.fmt] if level is None else level
+        self.read_size = read_size
+        # Checked once per read, add raises CopyStopped once it is set
+        self.stop_event = stop_event
+        # path -> (data offset, size, mtime)
+        self.members: Dict[str, Tuple[int, int, float]] = {}
+        self._file = open(path + PART_SUFFIX, 'wb')
+        self._sink = FrameWriter(self._file, self.fmt, self.level, workers, frame_size,
+                                 initializer)
+
+    def add(self, src_path: str, arcname: str) -> int:
+        """Append a file to the archive
+
+        A file that can't be read to the end is zero-filled to its header
+        size so the stream stays valid, and is left out of the index. A
+        stopped file is removed from the stream again, CopyStopped is raised.
+
+        Returns:
+            int: Number of bytes stored
+        """
+        with open(src_path, 'rb') as f:
+            start = self._sink.position
+            st = os.fstat(f.fileno())
+            info = tarfile.TarInfo(arcname.replace(os.sep, '/'))
+            info.size = st.st_size
+            info.mtime = st.st_mtime
+            info.mode = st.st_mode & 0o7777
+            self._sink.write(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+            offset = self._sink.position
+            remaining = info.size
+            throttle = get_throttle()
+            stop = self.stop_event
+            try:
+                while remaining:
+                    if stop is not None and stop.is_set():
+                        raise CopyStopped()
+                    data = f.read(min(self.read_size, remaining))
+                    if not data:
+                        raise OSError(f"{src_path} shrank while being archived")
+                    if throttle:
+                        throttle.read(len(data))
+                    self._sink.write(data)
+                    remaining -= len(data)
+            except CopyStopped:
+                # Zero-filling the rest of a large file would hold up the
+                # stop, the member is taken back out of the stream instead
+                self._sink.truncate(start)
+                raise
+            except BaseException:
+                self._sink.write(bytes(remaining + -info.size % BLOCK_SIZE))
+                raise
+            self._sink.write(bytes(-info.size % BLOCK_SIZE))
+        self.members[info.name] = (offset, info.size, info.mtime)
+        return info.size
+
+    def close(self):
+        """Finish the tar stream and move archive and index into place"""
+        # End-of-archive marker, padded to a full tar record
+        end = 2 * BLOCK_SIZE
+        self._sink.write(bytes(end + (-(self._sink.position + end) % RECORD_SIZE)))
+        self._sink.close()
+        self._file.close()
+        index_part = self.path + INDEX_SUFFIX + PART_SUFFIX
+        _write_index(index_part, self.fmt, self._sink.frames, self.members)
+        os.replace(self.path + PART_SUFFIX, self.path)
+        os.replace(index_part, self.path + INDEX_SUFFIX)
+        logger.info(f"Archive written: {self.path} ({len(self.members)} files, "
+                    f"{len(self._sink.frames)} frames)")
+
+    def abort(self):
+        """Drop an unfinished archive"""
+        self._sink.close()
+        self._file.close()
+        try:
+            os.remove(self.path + PART_SUFFIX)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def _write_index(index_path: str, fmt: str, frames, members):
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    conn = sqlite3.connect(index_path)
+    try:
+        with conn:
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('CREATE TABLE frames (uoffset INTEGER PRIMARY KEY, coffset INTEGER, '
+                         'csize INTEGER, usize INTEGER)')
+            conn.execute('CREATE TABLE members (path TEXT PRIMARY KEY, offset INTEGER, '
+                         'size INTEGER, mtime REAL)')
+            conn.execute('INSERT INTO meta VALUES (?, ?)', ('format', fmt))
+            conn.executemany('INSERT INTO frames VALUES (?, ?, ?, ?)', frames)
+            conn.executemany('INSERT INTO members VALUES (?, ?, ?, ?)',
+                             ((path, *entry) for path, entry in members.items()))
+    finally:
+        conn.close()
+
+
+def list_files(archive_path: str) -> Dict[str, Tuple[int, float]]:
+    """List the files of an archive from its index
+
+    Returns:
+        Dict[str, Tuple[int, float]]: Archive path -> (size, mtime)
+    """
+    conn = sqlite3.connect(f'file:{archive_path}{INDEX_SUFFIX}?mode=ro', uri=True)
+    try:
+        return {path: (size, mtime)
+                for path, size, mtime in conn.execute('SELECT path, size, mtime FROM members')}
+    finally:
+        conn.close()
+
+
+def extract_file(archive_path: str, name: str, out: BinaryIO) -> int:
+    """Extract one file, decompressing only the frames that hold it
+
+    Args:
+        archive_path (str): Archive written by ArchiveWriter
+        name (str): Path of the file inside the archive, '/' separated
+        out (BinaryIO): Where the file content is written
+
+    Returns:
+        int: Number of bytes written
+    """
+    conn = sqlite3.connect(f'file:{archive_path}{INDEX_SUFFIX}?mode=ro', uri=True)
+    try:
+        fmt = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()[0]
+        row = conn.execute('SELECT offset, size FROM members WHERE path = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"{name} is not in {archive_path}")
+        start, size = row
+        end = start + size
+        frames = conn.execute('SELECT uoffset, coffset, csize FROM frames '
+                              'WHERE uoffset + usize > ? AND uoffset < ? ORDER BY uoffset',
+                              (start, end)).fetchall()
+    finally:
+        conn.close()
+
+    written = 0
+    with open(archive_path, 'rb') as f:
+        for uoffset, coffset, csize in frames:
+            f.seek(coffset)
+            data = _decompress(fmt, f.read(csize))
+            piece = data[max(0, start - uoffset):end - uoffset]
+            out.write(piece)
+            written += len(piece)
+    return written
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+from .copy_backend import BACKENDS, DEFAULT_CHUNK_SIZE, PART_SUFFIX, get_buffer
+from .copy_engine import COPIED, FAILED, SKIPPED, UPDATED, CopyResult
+from .throttle import get_throttle
+
+
+class BlobStore:
+    """Content-addressed store of file bodies
+
+    Blobs live under <root>/<first two hex digits>/<sha256>, and device
+    trees reference them with hard links, so a file carried on several
+    sticks is stored once.
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def path_for_backup(backup_dst: str) -> str:
+        """Get the blob store location inside a backup destination"""
+        return os.path.join(backup_dst, '.usbbackup', 'blobs')
+
+    def blob_path(self, digest: str) -> str:
+        """Get the path of the blob with the given digest"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest: str) -> bool:
+        """Check if a blob is already stored"""
+        return os.path.exists(self.blob_path(digest))
+
+
+def hash_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """Get the sha256 hex digest of a file"""
+    digest = hashlib.sha256()
+    view = get_buffer(chunk_size)
+    throttle = get_throttle()
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            if throttle is not None:
+                throttle.read(n)
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str, backend: str, chunk_size: int):
+    """Hard link src to dst, copying when the filesystem has no hard links"""
+    tmp_dst = dst + PART_SUFFIX
+    try:
+        os.link(src, tmp_dst)
+    except OSError:
+        BACKENDS[backend](src, tmp_dst, chunk_size)
+    os.replace(tmp_dst, dst)
+
+
+def store_one(src_file: str, dst_file: str, src_mtime: Optional[float] = None,
+              backend: str = 'shutil', chunk_size: int = DEFAULT_CHUNK_SIZE,
+              resume: bool = False, blob_root: str = '') -> CopyResult:
+    """Store a file body in the blob store and link it into the device tree
+
+    Drop-in replacement for copy_engine.copy_one. The source is hashed
+    first; its body is only written when no blob with that hash exists.
+    A destination is only up to date when it already is that blob: it is
+    a link to a blob shared with other sticks, so its mtime says nothing
+    about this source. Blobs are always written in full, so resume is
+    accepted but ignored.
+
+    Returns:
+        CopyResult: (status, src_file, dst_file, error message or None, digest)
+    """
+    try:
+        store = BlobStore(blob_root)
+        digest = hash_file(src_file, chunk_size)
+        blob = store.blob_path(digest)
+        try:
+            blob_stat = os.stat(blob)
+        except FileNotFoundError:
+            blob_stat = None
+        try:
+            dst_stat = os.stat(dst_file)
+        except FileNotFoundError:
+            status = COPIED
+        else:
+            if blob_stat is not None and os.path.samestat(dst_stat, blob_stat):
+                return SKIPPED, src_file, dst_file, None, digest
+            status = UPDATED
+
+        if blob_stat is None:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_blob = f'{blob}.{os.getpid()}-{threading.get_ident()}.tmp'
+            try:
+                BACKENDS[backend](src_file, tmp_blob, chunk_size)
+                os.replace(tmp_blob, blob)
+            finally:
+                if os.path.exists(tmp_blob):
+                    os.remove(tmp_blob)
+        _link_or_copy(blob, dst_file, backend, chunk_size)
+        return status, src_file, dst_file, None, digest
+    except Exception as e:
+        return FAILED, src_file, dst_file, str(e), None
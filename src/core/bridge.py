@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Optional
+
+
+class LoopBridge:
+    """An asyncio event loop on its own thread, driven from synchronous code
+
+    The tray runs Qt's event loop on the main thread, so the backup core
+    gets a loop of its own. Every method may be called from any thread;
+    work is handed to the loop thread and a concurrent Future comes back,
+    which the caller may wait on or ignore.
+    """
+    def __init__(self, name: str = 'backup-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Run a coroutine on the loop"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, func: Callable[..., Any], *args) -> Future:
+        """Run func(*args) on the loop thread"""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(run)
+        return future
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the loop and wait for its thread to end"""
+        if self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
@@ -3,7 +3,8 @@ import yaml
 import platform
 import sys
 from typing import Dict, List, Any
-from .logger import logger
+from .logger import configure_logging, logger
+from .metrics import configure_metrics
 
 class Config:
     """Configuration management class"""
@@ -23,10 +24,83 @@ class Config:
         # Default config
         self.default_config = {
             'backup_dst': os.path.join(os.path.expanduser('~'), 'USBBackup'),
+            # 'mirror' copies every file, 'dedup' stores bodies once by content hash,
+            # 'archive' writes one compressed archive per device and run,
+            # 'snapshot' keeps a timestamped tree per run with unchanged files hard-linked
+            'storage_mode': 'mirror',
             'white_list': {
                 'dirname': [],
                 'filename': [],
                 'suffix': []
+            },
+            'monitor': {
+                'source': 'auto',
+                'poll_interval': 1.0
+            },
+            'copy': {
+                'workers': 4,
+                'executor': 'thread',
+                'backend': 'auto',
+                'chunk_size': 1048576,
+                'max_jobs': 2,
+                'max_streams': 8,
+                'resume_min_size': 16777216,
+                # 'mtime' trusts timestamps, 'hash' compares content hashes
+                'change_detection': 'mtime',
+                # Mirror mode updates files of at least this size block by block, 0 disables
+                'delta_min_size': 0,
+                'delta_block_size': 131072,
+                # 'scan', 'small_first' or 'newest_first'
+                'order': 'scan',
+                # Without room for the whole backup: 'trim' copies what fits, 'refuse' copies nothing
+                'on_low_space': 'trim',
+                'reserve_bytes': 104857600,
+                # Files up to this size are copied batch_files at a time by one worker
+                'small_file_size': 65536,
+                'batch_files': 32
+            },
+            'snapshot': {
+                # Retention, 0 disables a rule and all 0 keeps every snapshot
+                'keep_last': 10,
+                'keep_daily': 7,
+                'keep_weekly': 4,
+                'keep_monthly': 12
+            },
+            'archive': {
+                # 'auto', 'tar.zst' (needs zstandard) or 'tar.gz'
+                'format': 'auto',
+                # None uses the format's default level
+                'level': None,
+                'frame_size': 4194304
+            },
+            'log': {
+                # Log every file instead of one summary per job
+                'verbose': False,
+                'max_bytes': 10485760,
+                'backup_count': 5,
+                'keep_days': 30
+            },
+            'throttle': {
+                # Bytes per second, 0 means unlimited
+                'read_limit': 0,
+                'write_limit': 0,
+                'low_priority': False,
+                'idle_unthrottle': True
+            },
+            'trace': {
+                # Record per-phase timings of every job, for finding out what is slow
+                'enabled': False,
+                # 'none', 'cprofile' (one job at a time) or 'sampling' (all threads)
+                'profiler': 'none',
+                'sample_interval': 0.005,
+                # Empty writes to <backup_dst>/.usbbackup/traces
+                'dir': ''
+            },
+            'metrics': {
+                # Serve /metrics and /metrics.json on localhost, 0 disables
+                'port': 0,
+                # Write a JSON snapshot here after every job, empty disables
+                'json_path': ''
             }
         }
 
@@ -116,16 +190,81 @@ class Config:
         """Reload configuration"""
         logger.info("Reloading configuration")
         self.config = self.load_config()
+        configure_logging(self.log_settings)
+        configure_metrics(self.metrics_settings)
     
     @property
     def backup_dst(self) -> str:
         """Get backup destination path"""
         return self.config.get('backup_dst', self.default_config['backup_dst'])
     
+    @property
+    def storage_mode(self) -> str:
+        """Get backup storage mode"""
+        return self.config.get('storage_mode', self.default_config['storage_mode'])
+    
     @property
     def white_list(self) -> Dict[str, List[str]]:
         """Get whitelist configuration"""
         return self.config.get('white_list', self.default_config['white_list'])
 
+    @property
+    def monitor_settings(self) -> Dict[str, Any]:
+        """Get device monitor configuration, filling in missing keys with defaults"""
+        settings = self.default_config['monitor'].copy()
+        settings.update(self.config.get('monitor') or {})
+        return settings
+    
+    @property
+    def snapshot_settings(self) -> Dict[str, Any]:
+        """Get snapshot retention configuration, filling in missing keys with defaults"""
+        settings = self.default_config['snapshot'].copy()
+        settings.update(self.config.get('snapshot') or {})
+        return settings
+    
+    @property
+    def archive_settings(self) -> Dict[str, Any]:
+        """Get archive storage configuration, filling in missing keys with defaults"""
+        settings = self.default_config['archive'].copy()
+        settings.update(self.config.get('archive') or {})
+        return settings
+    
+    @property
+    def log_settings(self) -> Dict[str, Any]:
+        """Get logging configuration, filling in missing keys with defaults"""
+        settings = self.default_config['log'].copy()
+        settings.update(self.config.get('log') or {})
+        return settings
+    
+    @property
+    def throttle_settings(self) -> Dict[str, Any]:
+        """Get bandwidth and priority configuration, filling in missing keys with defaults"""
+        settings = self.default_config['throttle'].copy()
+        settings.update(self.config.get('throttle') or {})
+        return settings
+    
+    @property
+    def trace_settings(self) -> Dict[str, Any]:
+        """Get trace mode configuration, filling in missing keys with defaults"""
+        settings = self.default_config['trace'].copy()
+        settings.update(self.config.get('trace') or {})
+        return settings
+    
+    @property
+    def metrics_settings(self) -> Dict[str, Any]:
+        """Get metrics export configuration, filling in missing keys with defaults"""
+        settings = self.default_config['metrics'].copy()
+        settings.update(self.config.get('metrics') or {})
+        return settings
+    
+    @property
+    def copy_settings(self) -> Dict[str, Any]:
+        """Get copy engine configuration, filling in missing keys with defaults"""
+        settings = self.default_config['copy'].copy()
+        settings.update(self.config.get('copy') or {})
+        return settings
+
 # Create global configuration instance
-config = Config() 
\ No newline at end of file
+config = Config()
+configure_logging(config.log_settings) 
+configure_metrics(config.metrics_settings)
@@ -0,0 +1,393 @@
+import errno
+import os
+import queue
+import shutil
+import sys
+import threading
+from typing import Callable, Dict
+from .logger import logger
+from .throttle import get_throttle
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Suffix of destination files that are still being written
+PART_SUFFIX = '.usbbackup-part'
+
+# errno values meaning "this kernel copy path is not available here", after
+# which the next backend is tried
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EPERM,
+}
+
+# Buffers in flight between the reader and writer of a pipelined copy
+PIPELINE_DEPTH = 4
+
+_buffers = threading.local()
+
+
+class CopyStopped(Exception):
+    """Raised between two chunks of a copy whose job was stopped
+
+    The part file is left as it is, so the journal can resume it.
+    """
+    def __init__(self):
+        super().__init__('Copy stopped')
+
+
+class _StopLocal(threading.local):
+    # Threads never given a stop event copy every file to the end
+    event = None
+
+
+_stop = _StopLocal()
+
+
+def set_stop_event(event):
+    """Make copies on the calling worker thread stop once event is set
+
+    Process workers need a multiprocessing.Event, handed over by the
+    executor initializer.
+    """
+    _stop.event = event
+
+
+def get_stop_event():
+    """Get the stop event of the calling worker thread, None if it has none"""
+    return _stop.event
+
+
+def get_buffer(chunk_size: int) -> memoryview:
+    """Get a reusable per-thread buffer of chunk_size bytes"""
+    view = getattr(_buffers, 'view', None)
+    if view is None or len(view) != chunk_size:
+        view = memoryview(bytearray(chunk_size))
+        _buffers.view = view
+    return view
+
+
+def get_buffer_pool(chunk_size: int, count: int = PIPELINE_DEPTH):
+    """Get count reusable per-thread buffers of chunk_size bytes"""
+    pool = getattr(_buffers, 'pool', None)
+    if pool is None or len(pool) != count or len(pool[0]) != chunk_size:
+        pool = [memoryview(bytearray(chunk_size)) for _ in range(count)]
+        _buffers.pool = pool
+    return pool
+
+
+def advise(fd: int, advice_name: str):
+    """Give the kernel an access pattern hint where posix_fadvise exists"""
+    advice = getattr(os, advice_name, None)
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError:
+        pass
+
+
+def copy_shutil(src_file: str, dst_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Copy with shutil.copy2 (the platform's default fast path)
+
+    shutil cannot be rate limited, so throttled copies use the chunked loop.
+    """
+    if get_throttle() is not None:
+        copy_chunked(src_file, dst_file, chunk_size)
+        return
+    shutil.copy2(src_file, dst_file)
+
+
+def copy_chunked(src_file: str, dst_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Copy with a readinto loop over a reusable memoryview"""
+    view = get_buffer(chunk_size)
+    with open(src_file, 'rb', buffering=0) as fsrc, open(dst_file, 'wb', buffering=0) as fdst:
+        advise(fsrc.fileno(), 'POSIX_FADV_SEQUENTIAL')
+        _copy_chunked_fd(fsrc, fdst, view)
+    shutil.copystat(src_file, dst_file)
+
+
+def copy_pipelined(src_file: str, dst_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Copy with a reader and a writer running at the same time
+
+    The calling thread reads into a fixed pool of PIPELINE_DEPTH buffers
+    while a writer thread empties them into the destination, so a slow
+    stick and a slow (e.g. network) destination work in parallel instead
+    of taking turns. Buffers go back to the reader once written; nothing
+    is allocated per chunk. Files under two chunks use the chunked loop.
+    """
+    with open(src_file, 'rb', buffering=0) as fsrc, open(dst_file, 'wb', buffering=0) as fdst:
+        advise(fsrc.fileno(), 'POSIX_FADV_SEQUENTIAL')
+        if os.fstat(fsrc.fileno()).st_size < 2 * chunk_size:
+            _copy_chunked_fd(fsrc, fdst, get_buffer(chunk_size))
+        else:
+            _copy_pipelined_fd(fsrc, fdst, get_buffer_pool(chunk_size))
+        # The stick is read once, don't let it push other data out of the cache
+        advise(fsrc.fileno(), 'POSIX_FADV_DONTNEED')
+    shutil.copystat(src_file, dst_file)
+
+
+def _copy_pipelined_fd(fsrc, fdst, pool):
+    free = queue.SimpleQueue()
+    filled = queue.SimpleQueue()
+    for view in pool:
+        free.put(view)
+    errors = []
+    throttle = get_throttle()
+    stop = _stop.event
+
+    def write_behind():
+        try:
+            while True:
+                item = filled.get()
+                if item is None:
+                    return
+                view, n = item
+                if throttle is not None:
+                    throttle.write(n)
+                written = 0
+                while written < n:
+                    written += fdst.write(view[written:n])
+                free.put(view)
+        except BaseException as e:
+            errors.append(e)
+            # Wake the reader if it waits for a buffer
+            free.put(None)
+
+    writer = threading.Thread(target=write_behind, name='copy-writer', daemon=True)
+    writer.start()
+    try:
+        while not errors:
+            view = free.get()
+            if view is None:
+                break
+            if stop is not None and stop.is_set():
+                raise CopyStopped()
+            n = fsrc.readinto(view)
+            if not n:
+                break
+            if throttle is not None:
+                throttle.read(n)
+            filled.put((view, n))
+    finally:
+        filled.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
+def _copy_chunked_fd(fsrc, fdst, view: memoryview):
+    throttle = get_throttle()
+    stop = _stop.event
+    while True:
+        if stop is not None and stop.is_set():
+            raise CopyStopped()
+        n = fsrc.readinto(view)
+        if not n:
+            break
+        if throttle is not None:
+            throttle.read(n)
+            throttle.write(n)
+        # Raw file objects may write less than asked for
+        written = 0
+        while written < n:
+            written += fdst.write(view[written:n])
+
+
+def resume_copy(src_file: str, dst_file: str, offset: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Append the source from offset onwards to a partially written file"""
+    view = get_buffer(chunk_size)
+    with open(src_file, 'rb', buffering=0) as fsrc, open(dst_file, 'r+b', buffering=0) as fdst:
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        fdst.truncate()
+        _copy_chunked_fd(fsrc, fdst, view)
+    shutil.copystat(src_file, dst_file)
+
+
+def copy_atomic(copy_file: Callable[..., None], src_file: str, dst_file: str,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = False):
+    """Copy into a part file next to dst_file, then rename it into place
+
+    Readers never see a half written destination, and a replaced file that
+    is a hard link gets a new inode instead of being written through.
+
+    Args:
+        copy_file (Callable): Backend used for a fresh copy
+        resume (bool): Continue an existing part file instead of starting over
+    """
+    part_file = dst_file + PART_SUFFIX
+    offset = 0
+    if resume:
+        try:
+            offset = os.path.getsize(part_file)
+        except OSError:
+            offset = 0
+        if offset > os.path.getsize(src_file):
+            offset = 0
+    if offset:
+        resume_copy(src_file, part_file, offset, chunk_size)
+    else:
+        copy_file(src_file, part_file, chunk_size)
+    os.replace(part_file, dst_file)
+
+
+def remove_part(dst_file: str):
+    """Delete the part file a failed copy to dst_file may have left"""
+    try:
+        os.remove(dst_file + PART_SUFFIX)
+    except OSError:
+        pass
+
+
+def copy_kernel(src_file: str, dst_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Copy inside the kernel with copy_file_range, then sendfile
+
+    Falls back to the chunked loop when neither call is usable for this
+    pair of files (different filesystems on older kernels, FUSE mounts, ...).
+    """
+    with open(src_file, 'rb', buffering=0) as fsrc, open(dst_file, 'wb', buffering=0) as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        advise(infd, 'POSIX_FADV_SEQUENTIAL')
+        size = os.fstat(infd).st_size
+        if not (_kernel_copy(os.copy_file_range if hasattr(os, 'copy_file_range') else None,
+                             infd, outfd, size, chunk_size, pass_offset=False) or
+                _kernel_copy(getattr(os, 'sendfile', None),
+                             infd, outfd, size, chunk_size, pass_offset=True)):
+            _copy_chunked_fd(fsrc, fdst, get_buffer(chunk_size))
+    shutil.copystat(src_file, dst_file)
+
+
+def _kernel_copy(func, infd: int, outfd: int, size: int, chunk_size: int,
+                 pass_offset: bool) -> bool:
+    """Run a kernel copy call until EOF
+
+    Returns:
+        bool: False if the call is unsupported and nothing was copied yet
+    """
+    if func is None:
+        return False
+    copied = 0
+    throttle = get_throttle()
+    # Large blocks keep the syscall count low even for small chunk settings,
+    # throttled copies go chunk by chunk so the limiter stays smooth
+    block = chunk_size if throttle is not None else max(chunk_size, 8 * 1024 * 1024)
+    stop = _stop.event
+    while True:
+        if stop is not None and stop.is_set():
+            raise CopyStopped()
+        try:
+            if pass_offset:
+                n = func(outfd, infd, copied, block)
+            else:
+                n = func(infd, outfd, block)
+        except OSError as e:
+            if copied == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if n == 0:
+            break
+        copied += n
+        if throttle is not None:
+            throttle.read(n)
+            throttle.write(n)
+    if copied == 0 and size > 0:
+        # Some filesystems report size but return no data (procfs, sysfs)
+        return False
+    return True
+
+
+def copy_small(src_file: str, dst_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Copy a small file with one read and one write
+
+    Sets times with futimens and the mode only when the umask changed it,
+    instead of copystat's stat, utime, chmod and xattr calls. Extended
+    attributes are not copied.
+    """
+    fd = os.open(src_file, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        st = os.fstat(fd)
+        # Copy the size found by fstat, as of when the file was opened
+        data = os.read(fd, st.st_size) if st.st_size else b''
+        while len(data) < st.st_size:
+            more = os.read(fd, st.st_size - len(data))
+            if not more:
+                break
+            data += more
+    finally:
+        os.close(fd)
+    throttle = get_throttle()
+    if throttle is not None:
+        throttle.read(len(data))
+        throttle.write(len(data))
+
+    mode = st.st_mode & 0o7777
+    fd = os.open(dst_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0),
+                 mode | 0o200)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if os.utime in os.supports_fd:
+            os.utime(fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+        else:
+            os.utime(dst_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # A new file gets mode minus the umask, fix it only if that differs
+        if hasattr(os, 'fchmod') and os.fstat(fd).st_mode & 0o7777 != mode:
+            os.fchmod(fd, mode)
+    finally:
+        os.close(fd)
+
+
+BACKENDS: Dict[str, Callable[..., None]] = {
+    'shutil': copy_shutil,
+    'chunked': copy_chunked,
+    'kernel': copy_kernel,
+    'small': copy_small,
+    'pipelined': copy_pipelined,
+}
+
+
+class DirCache:
+    """Create destination directories once per job
+
+    Directories are created lazily when their first file shows up; known
+    ones (and their parents) are remembered so later files only cost a
+    set lookup instead of a makedirs call.
+    """
+    def __init__(self):
+        self.known = set()
+
+    def ensure(self, path: str):
+        if path in self.known:
+            return
+        os.makedirs(path, exist_ok=True)
+        while path not in self.known:
+            self.known.add(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+
+def get_backend(name: str) -> Callable[..., None]:
+    """Get a copy backend by name
+
+    'auto' picks the kernel path on Linux and shutil on macOS. On Windows,
+    where most sticks are backed up, shutil.copy2 can't be stopped half
+    way, so the chunked loop is used and a stop takes effect between chunks.
+
+    Returns:
+        Callable: backend(src_file, dst_file, chunk_size)
+    """
+    if name == 'auto':
+        if sys.platform.startswith('linux'):
+            name = 'kernel'
+        elif sys.platform == 'win32':
+            name = 'chunked'
+        else:
+            name = 'shutil'
+    backend = BACKENDS.get(name)
+    if backend is None:
+        logger.warning(f"Unknown copy backend '{name}', falling back to 'shutil'")
+        backend = copy_shutil
+    return backend
@@ -0,0 +1,250 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from .copy_backend import (BACKENDS, DEFAULT_CHUNK_SIZE, CopyStopped, copy_atomic, get_backend,
+                           set_stop_event)
+from .logger import logger
+from . import metrics
+from .tracing import span
+
+# Result status values returned by copy workers
+COPIED = 'copied'
+UPDATED = 'updated'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# (status, src_file, dst_file, error message, content hash)
+CopyResult = Tuple[str, str, str, Optional[str], Optional[str]]
+
+# Error message of a copy interrupted by a stop
+_STOPPED = str(CopyStopped())
+
+
+def copy_one(src_file: str, dst_file: str, src_mtime: Optional[float] = None,
+             backend: str = 'shutil', chunk_size: int = DEFAULT_CHUNK_SIZE,
+             resume: bool = False) -> CopyResult:
+    """Copy a single file if the destination is missing or older
+
+    Runs inside a worker, so it must stay a module level function
+    (process pools pickle it by reference).
+
+    Args:
+        src_file (str): Source file path
+        dst_file (str): Destination file path
+        src_mtime (float): Source mtime if the caller already stat'ed it
+        backend (str): Name of the copy backend to use
+        chunk_size (int): Buffer size for chunked copies
+        resume (bool): Continue a part file left by an interrupted copy
+
+    Returns:
+        CopyResult: (status, src_file, dst_file, error message or None, None)
+    """
+    copy_file = BACKENDS[backend]
+    try:
+        try:
+            with span('stat destination'):
+                dst_mtime = os.stat(dst_file).st_mtime
+        except FileNotFoundError:
+            status = COPIED
+        else:
+            # Check if destination file is newer than source file
+            if src_mtime is None:
+                src_mtime = os.path.getmtime(src_file)
+            if src_mtime <= dst_mtime:
+                return SKIPPED, src_file, dst_file, None, None
+            status = UPDATED
+        with span('write'):
+            copy_atomic(copy_file, src_file, dst_file, chunk_size, resume)
+        return status, src_file, dst_file, None, None
+    except Exception as e:
+        return FAILED, src_file, dst_file, str(e), None
+
+
+# (src_file, dst_file, src_mtime, resume, task keyword arguments)
+BatchItem = Tuple[str, str, Optional[float], bool, Dict[str, Any]]
+
+
+def copy_batch(task: Callable[..., CopyResult], items: List[BatchItem], backend: str,
+               chunk_size: int) -> List[CopyResult]:
+    """Run task for several files in one worker call
+
+    Used for small files, where handing each file to the pool on its own
+    costs more than copying it.
+    """
+    return [task(src_file, dst_file, src_mtime, backend, chunk_size, resume, **kwargs)
+            for src_file, dst_file, src_mtime, resume, kwargs in items]
+
+
+def init_worker(stop_event, initializer: Optional[Callable[..., None]], initargs: tuple):
+    """Executor initializer: install the job's stop event, then run initializer"""
+    set_stop_event(stop_event)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _timed(func: Callable, *args, **kwargs) -> Tuple[float, Any]:
+    """Run func in a worker and also return the seconds it took"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class CopyEngine:
+    """Copy files on a pool of workers
+
+    The caller keeps walking the source tree and submits files as it finds
+    them, so directory listing and file copies overlap. Results are logged
+    in submission order, which keeps the log identical to a sequential run.
+    """
+    EXECUTORS = {
+        'thread': ThreadPoolExecutor,
+        'process': ProcessPoolExecutor,
+    }
+
+    def __init__(self, workers: int = 4, executor: str = 'thread',
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 on_result: Optional[Callable[[CopyResult, Any], None]] = None,
+                 backend: str = 'auto', chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 task: Callable[..., CopyResult] = copy_one, streams=None,
+                 initializer: Optional[Callable[..., None]] = None, initargs: tuple = (),
+                 stop_event=None):
+        if executor not in self.EXECUTORS:
+            logger.warning(f"Unknown copy executor '{executor}', falling back to 'thread'")
+            executor = 'thread'
+        self.workers = max(1, int(workers))
+        self.executor_name = executor
+        self.should_stop = should_stop or (lambda: False)
+        self.on_result = on_result
+        # Resolve 'auto' here so workers only ever see a concrete backend name
+        backend_func = get_backend(backend)
+        self.backend = next(name for name, func in BACKENDS.items() if func is backend_func)
+        self.chunk_size = max(4096, int(chunk_size))
+        # Per-file worker function, copy_one or a drop-in with the same signature
+        self.task = task
+        # Optional shared stream limit (anything with acquire() and release())
+        self.streams = streams
+        # Run in every worker on start, e.g. to set throttling and priority
+        self.initializer = initializer
+        self.initargs = initargs
+        # Checked by the backends once per chunk, so a stop does not wait
+        # for the current file; a multiprocessing.Event for process workers
+        self.stop_event = stop_event
+        # Bound the number of queued files so a huge tree does not pile up in memory
+        self.max_pending = self.workers * 4
+        self._executor = None
+        # (future, tag, True for a batch whose tag is a list of tags)
+        self._pending: Deque[Tuple[Future, Any, bool]] = deque()
+        self.stats = {COPIED: 0, UPDATED: 0, SKIPPED: 0, FAILED: 0}
+        # Per-file lines only in verbose mode, checked once instead of per file
+        self.log_files = logger.isEnabledFor(logging.DEBUG)
+
+    def __enter__(self):
+        initializer, initargs = self.initializer, self.initargs
+        if self.stop_event is not None:
+            initializer, initargs = init_worker, (self.stop_event, initializer, initargs)
+        self._executor = self.EXECUTORS[self.executor_name](
+            max_workers=self.workers, initializer=initializer, initargs=initargs)
+        logger.debug("Copy engine started with %d %s workers using the '%s' backend",
+                     self.workers, self.executor_name, self.backend)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.should_stop() or exc_type is not None:
+            self._cancel_pending()
+        self.drain()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        return False
+
+    def submit(self, src_file: str, dst_file: str, tag: Any = None,
+               src_mtime: Optional[float] = None, resume: bool = False, **task_kwargs):
+        """Queue a file copy, blocking while too many copies are pending
+
+        Args:
+            src_file (str): Source file path
+            dst_file (str): Destination file path
+            tag (Any): Passed back to the on_result callback with the result
+            src_mtime (float): Source mtime if already known, saves a stat call
+            resume (bool): Continue a part file left by an interrupted copy
+            **task_kwargs: Extra keyword arguments of a drop-in task
+        """
+        self._queue(False, tag, self.task, src_file, dst_file, src_mtime, self.backend,
+                    self.chunk_size, resume, **task_kwargs)
+    
+    def submit_batch(self, items: List[BatchItem], tags: List[Any]):
+        """Queue several small files as one worker call
+        
+        They are copied with the small-file backend, one read and one
+        write each. Results are still logged and reported per file.
+        
+        Args:
+            items (List[BatchItem]): (src_file, dst_file, src_mtime, resume, task kwargs)
+            tags (List[Any]): Tag of each item, passed back to on_result
+        """
+        self._queue(True, tags, copy_batch, self.task, items, 'small', self.chunk_size)
+    
+    def _queue(self, batch: bool, tag: Any, func: Callable, *args, **kwargs):
+        while len(self._pending) >= self.max_pending:
+            self._finish(*self._pop())
+        # Handle whatever finished in the meantime without blocking
+        while self._pending and self._pending[0][0].done():
+            self._finish(*self._pop())
+        if self.streams is not None:
+            self.streams.acquire()
+        future = self._executor.submit(_timed, func, *args, **kwargs)
+        if self.streams is not None:
+            future.add_done_callback(lambda _: self.streams.release())
+        self._pending.append((future, tag, batch))
+        metrics.queue_depth.inc(len(tag) if batch else 1)
+
+    def _pop(self) -> Tuple[Future, Any, bool]:
+        future, tag, batch = self._pending.popleft()
+        metrics.queue_depth.dec(len(tag) if batch else 1)
+        return future, tag, batch
+
+    def drain(self):
+        """Wait for all queued copies and log their results"""
+        while self._pending:
+            future, tag, batch = self._pop()
+            if not future.cancelled():
+                self._finish(future, tag, batch)
+
+    def _cancel_pending(self):
+        """Cancel copies that have not started yet"""
+        cancelled = sum(len(tag) if batch else 1
+                        for future, tag, batch in self._pending if future.cancel())
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} pending file copies")
+
+    def _finish(self, future: Future, tag: Any, batch: bool = False):
+        elapsed, results = future.result()
+        if batch:
+            tags = tag
+            elapsed /= max(1, len(results))
+        else:
+            results, tags = [results], [tag]
+        for result, result_tag in zip(results, tags):
+            metrics.file_copy_seconds.observe(elapsed)
+            self._log_result(result)
+            if self.on_result is not None:
+                self.on_result(result, result_tag)
+
+    def _log_result(self, result: CopyResult):
+        status, src_file, dst_file, error, _ = result
+        self.stats[status] += 1
+        if status == FAILED:
+            if error == _STOPPED:
+                logger.info("Stopped copying %s, it is continued next time", src_file)
+            else:
+                logger.error("Failed to copy file %s: %s", src_file, error)
+        elif not self.log_files:
+            return
+        elif status == COPIED:
+            logger.debug("Copied: %s -> %s", src_file, dst_file)
+        elif status == UPDATED:
+            logger.debug("Updated: %s -> %s", src_file, dst_file)
+        else:
+            logger.debug("Skipped: %s (destination is up to date)", src_file)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import struct
+from typing import Callable, List, Optional
+from .copy_backend import DEFAULT_CHUNK_SIZE, PART_SUFFIX, CopyStopped, get_stop_event
+from .copy_engine import FAILED, SKIPPED, UPDATED, CopyResult, copy_one
+from .hashing import new_hasher, format_hash
+from .throttle import get_throttle
+
+DEFAULT_BLOCK_SIZE = 128 * 1024
+STRONG_SIZE = 16
+# size, mtime_ns and block size of the destination the signature describes
+_HEADER = struct.Struct('<QqI')
+# Next to a signature while its destination is being updated in place
+UNFINISHED_SUFFIX = '.unfinished'
+
+
+def signature_path(sig_root: str, dst_file: str) -> str:
+    """Get where the block signature of a destination file is stored"""
+    key = hashlib.sha1(os.path.abspath(dst_file).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(sig_root, key[:2], key + '.sig')
+
+
+def _block_digest(block) -> bytes:
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+
+def load_signature(sig_file: str, dst_stat: os.stat_result, block_size: int) -> Optional[List[bytes]]:
+    """Load stored block digests if they still describe the destination"""
+    try:
+        with open(sig_file, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    size, mtime_ns, stored_block_size = _HEADER.unpack_from(data)
+    if (size, mtime_ns, stored_block_size) != (dst_stat.st_size, dst_stat.st_mtime_ns, block_size):
+        return None
+    body = data[_HEADER.size:]
+    return [body[i:i + STRONG_SIZE] for i in range(0, len(body), STRONG_SIZE)]
+
+
+def compute_signature(dst_file: str, block_size: int) -> List[bytes]:
+    """Read the destination once to get its block digests"""
+    digests = []
+    throttle = get_throttle()
+    stop = get_stop_event()
+    with open(dst_file, 'rb') as f:
+        while True:
+            if stop is not None and stop.is_set():
+                raise CopyStopped()
+            block = f.read(block_size)
+            if not block:
+                break
+            if throttle is not None:
+                throttle.read(len(block))
+            digests.append(_block_digest(block))
+    return digests
+
+
+def save_signature(sig_file: str, dst_stat: os.stat_result, block_size: int,
+                   digests: List[bytes]):
+    os.makedirs(os.path.dirname(sig_file), exist_ok=True)
+    tmp_file = sig_file + PART_SUFFIX
+    with open(tmp_file, 'wb') as f:
+        f.write(_HEADER.pack(dst_stat.st_size, dst_stat.st_mtime_ns, block_size))
+        f.write(b''.join(digests))
+    os.replace(tmp_file, sig_file)
+
+
+def delta_one(src_file: str, dst_file: str, src_mtime: Optional[float] = None,
+              backend: str = 'shutil', chunk_size: int = DEFAULT_CHUNK_SIZE,
+              resume: bool = False, sig_root: str = '', min_size: int = 0,
+              block_size: int = DEFAULT_BLOCK_SIZE,
+              fallback: Callable[..., CopyResult] = copy_one, trust_mtime: bool = True,
+              **kwargs) -> CopyResult:
+    """Update a large destination file in place, writing only changed blocks
+
+    Drop-in replacement for copy_engine.copy_one. The source is read in
+    blocks and each block's digest is compared with the digest of the same
+    block of the existing copy, taken from its stored signature, so the
+    destination is only read when no valid signature exists. Files below
+    min_size, new files and hard-linked destinations go to fallback.
+
+    Returns:
+        CopyResult: (status, src_file, dst_file, error message or None, content hash)
+    """
+    try:
+        try:
+            dst_stat = os.stat(dst_file)
+        except FileNotFoundError:
+            dst_stat = None
+        src_stat = os.stat(src_file)
+        # In-place writes would go through to every other name of a hard link
+        if src_stat.st_size < min_size or (dst_stat is not None and dst_stat.st_nlink > 1):
+            return fallback(src_file, dst_file, src_mtime, backend, chunk_size, resume, **kwargs)
+        if dst_stat is None:
+            # Sign the fresh copy while it is still in the page cache
+            result = fallback(src_file, dst_file, src_mtime, backend, chunk_size, resume, **kwargs)
+            if result[0] != FAILED:
+                save_signature(signature_path(sig_root, dst_file), os.stat(dst_file), block_size,
+                               compute_signature(dst_file, block_size))
+            return result
+        sig_file = signature_path(sig_root, dst_file)
+        marker = sig_file + UNFINISHED_SUFFIX
+        # Writes set the mtime to now, so an update that never finished
+        # left a mixed file that looks newer than the source
+        unfinished = os.path.exists(marker)
+        if trust_mtime and not unfinished and src_stat.st_mtime <= dst_stat.st_mtime:
+            return SKIPPED, src_file, dst_file, None, None
+
+        old_digests = load_signature(sig_file, dst_stat, block_size)
+        if old_digests is None:
+            old_digests = compute_signature(dst_file, block_size)
+        # A crash half way through leaves a mixed file, so the signature
+        # must not survive until the update is complete
+        try:
+            os.remove(sig_file)
+        except FileNotFoundError:
+            pass
+        if not unfinished:
+            os.makedirs(os.path.dirname(marker), exist_ok=True)
+            open(marker, 'wb').close()
+
+        digests = []
+        changed = 0
+        hasher = new_hasher()
+        throttle = get_throttle()
+        stop = get_stop_event()
+        with open(src_file, 'rb') as fsrc, open(dst_file, 'r+b') as fdst:
+            index = 0
+            while True:
+                if stop is not None and stop.is_set():
+                    # The marker stays, the next run compares every block
+                    raise CopyStopped()
+                block = fsrc.read(block_size)
+                if not block:
+                    break
+                if throttle is not None:
+                    throttle.read(len(block))
+                hasher.update(block)
+                digest = _block_digest(block)
+                if index >= len(old_digests) or old_digests[index] != digest:
+                    if throttle is not None:
+                        throttle.write(len(block))
+                    fdst.seek(index * block_size)
+                    fdst.write(block)
+                    changed += 1
+                digests.append(digest)
+                index += 1
+            fdst.truncate(src_stat.st_size)
+        shutil.copystat(src_file, dst_file)
+        save_signature(sig_file, os.stat(dst_file), block_size, digests)
+        os.remove(marker)
+        # A part file left by an earlier full copy is no longer needed
+        try:
+            os.remove(dst_file + PART_SUFFIX)
+        except FileNotFoundError:
+            pass
+        status = UPDATED if changed or src_stat.st_size != dst_stat.st_size else SKIPPED
+        return status, src_file, dst_file, None, format_hash(hasher)
+    except Exception as e:
+        return FAILED, src_file, dst_file, str(e), None
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import select
+import sys
+import threading
+import time
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, Iterable, NamedTuple, Optional, Set
+from .logger import logger
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+# Longest a blocking wait for a change runs, bounds how late a stop is noticed
+WAIT_TIMEOUT = 0.5
+
+
+class DeviceEvent(NamedTuple):
+    """A drive appearing or going away"""
+    kind: str  # 'added' or 'removed'
+    drive: str
+
+
+class DeviceSource:
+    """Source of USB drive change notifications
+
+    The monitor asks the source to wait for a possible change, and only
+    then enumerates drives. Subclasses decide how waiting is done.
+    """
+    def __init__(self, enumerate_drives: Callable[[], Set[str]]):
+        self.enumerate_drives = enumerate_drives
+
+    def get_drives(self) -> Set[str]:
+        """Get the drives currently present"""
+        return self.enumerate_drives()
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Block until drives may have changed or timeout expires
+
+        Returns:
+            bool: True if drives should be enumerated again
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the source"""
+
+
+class PollingDeviceSource(DeviceSource):
+    """Re-enumerate drives on a fixed interval"""
+    def __init__(self, enumerate_drives: Callable[[], Set[str]], interval: float = 1.0):
+        super().__init__(enumerate_drives)
+        self.interval = interval
+        self._next_poll = time.monotonic() + interval
+
+    def wait_for_change(self, timeout: float) -> bool:
+        remaining = self._next_poll - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return False
+        if remaining > 0:
+            time.sleep(remaining)
+        self._next_poll = time.monotonic() + self.interval
+        return True
+
+
+class MountinfoDeviceSource(DeviceSource):
+    """Wake up on mount table changes (Linux)
+
+    The kernel flags /proc/self/mountinfo with POLLPRI whenever something
+    is mounted or unmounted, so the monitor sleeps in poll() with no CPU
+    use while nothing happens.
+    """
+    def __init__(self, enumerate_drives: Callable[[], Set[str]],
+                 mountinfo_path: str = MOUNTINFO_PATH):
+        super().__init__(enumerate_drives)
+        self._file = open(mountinfo_path, 'rb')
+        self._poller = select.poll()
+        self._poller.register(self._file.fileno(), select.POLLPRI | select.POLLERR)
+        self._drain()
+
+    def _drain(self):
+        # The file has to be read to the end to re-arm the notification
+        self._file.seek(0)
+        while self._file.read(65536):
+            pass
+
+    def wait_for_change(self, timeout: float) -> bool:
+        if not self._poller.poll(int(timeout * 1000)):
+            return False
+        self._drain()
+        return True
+
+    def close(self):
+        self._file.close()
+
+
+class FakeDeviceSource(DeviceSource):
+    """In-memory device source for driving the monitor without hardware"""
+    def __init__(self, drives: Iterable[str] = ()):
+        super().__init__(lambda: set(self.drives))
+        self.drives: Set[str] = set(drives)
+        self._changed = threading.Event()
+
+    def insert(self, drive: str):
+        """Simulate plugging in a drive"""
+        self.drives.add(drive)
+        self._changed.set()
+
+    def remove(self, drive: str):
+        """Simulate unplugging a drive"""
+        self.drives.discard(drive)
+        self._changed.set()
+
+    def wait_for_change(self, timeout: float) -> bool:
+        if not self._changed.wait(timeout):
+            return False
+        self._changed.clear()
+        return True
+
+
+async def device_events(source: DeviceSource, executor: Optional[Executor] = None,
+                        known: Optional[Set[str]] = None) -> AsyncIterator[DeviceEvent]:
+    """Yield drive changes of source as they happen
+
+    Waiting and enumerating block, so they run in executor (one thread is
+    enough for any number of drives). Closing the generator or cancelling
+    the task iterating it stops at once; a wait already running in the
+    executor ends on its own within WAIT_TIMEOUT.
+
+    Args:
+        source (DeviceSource): Where changes come from
+        executor (Executor): Runs the blocking calls, the loop's default if None
+        known (Set[str]): Drives already present, enumerated now if None
+    """
+    loop = asyncio.get_running_loop()
+    if known is None:
+        known = await loop.run_in_executor(executor, source.get_drives)
+    while True:
+        if not await loop.run_in_executor(executor, source.wait_for_change, WAIT_TIMEOUT):
+            continue
+        current = await loop.run_in_executor(executor, source.get_drives)
+        for drive in sorted(known - current):
+            yield DeviceEvent('removed', drive)
+        for drive in sorted(current - known):
+            yield DeviceEvent('added', drive)
+        known = current
+
+
+def create_device_source(enumerate_drives: Callable[[], Set[str]], source: str = 'auto',
+                         poll_interval: float = 1.0) -> DeviceSource:
+    """Create the best available device source
+
+    Args:
+        enumerate_drives (Callable[[], Set[str]]): Lists the current USB drives
+        source (str): 'auto', 'mountinfo' or 'poll'
+        poll_interval (float): Seconds between polls for the polling source
+
+    Returns:
+        DeviceSource: Event-driven source where supported, polling otherwise
+    """
+    if source in ('auto', 'mountinfo') and sys.platform.startswith('linux'):
+        if os.path.exists(MOUNTINFO_PATH) and hasattr(select, 'poll'):
+            try:
+                device_source = MountinfoDeviceSource(enumerate_drives)
+                logger.info("Using mount table notifications for USB detection")
+                return device_source
+            except OSError as e:
+                logger.warning(f"Mount table notifications unavailable: {e}")
+    if source not in ('auto', 'poll'):
+        logger.warning(f"Device source '{source}' is not supported here, polling instead")
+    logger.info(f"Polling for USB devices every {poll_interval}s")
+    return PollingDeviceSource(enumerate_drives, poll_interval)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+from typing import Optional
+from .copy_backend import (DEFAULT_CHUNK_SIZE, PART_SUFFIX, CopyStopped, get_buffer,
+                           get_stop_event)
+from .copy_engine import COPIED, FAILED, SKIPPED, UPDATED, CopyResult
+from .throttle import get_throttle
+
+# Fastest available non-cryptographic (or cheap cryptographic) hash
+try:
+    import xxhash
+    HASH_NAME = 'xxh3_128'
+    new_hasher = xxhash.xxh3_128
+except ImportError:
+    try:
+        import blake3
+        HASH_NAME = 'blake3'
+        new_hasher = blake3.blake3
+    except ImportError:
+        HASH_NAME = 'blake2b'
+        new_hasher = lambda: hashlib.blake2b(digest_size=16)
+
+
+def format_hash(hasher) -> str:
+    """Get the stored form of a hash, prefixed with its algorithm
+
+    The prefix keeps hashes from another algorithm (or the sha256 digests
+    of dedup mode) from ever comparing equal.
+    """
+    return f'{HASH_NAME}:{hasher.hexdigest()}'
+
+
+def is_content_hash(value: Optional[str]) -> bool:
+    """Check if a stored hash was made by this module's algorithm"""
+    return bool(value) and value.startswith(HASH_NAME + ':')
+
+
+def _hash_fd(f, hasher, view: memoryview, dst=None):
+    """Feed a file into hasher, optionally copying it to dst on the way"""
+    throttle = get_throttle()
+    stop = get_stop_event()
+    while True:
+        if stop is not None and stop.is_set():
+            raise CopyStopped()
+        n = f.readinto(view)
+        if not n:
+            break
+        if throttle is not None:
+            throttle.read(n)
+        hasher.update(view[:n])
+        if dst is not None:
+            if throttle is not None:
+                throttle.write(n)
+            written = 0
+            while written < n:
+                written += dst.write(view[written:n])
+
+
+def hash_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """Hash a file in chunks, without holding it in memory"""
+    hasher = new_hasher()
+    with open(path, 'rb', buffering=0) as f:
+        _hash_fd(f, hasher, get_buffer(chunk_size))
+    return format_hash(hasher)
+
+
+def copy_hashed(src_file: str, dst_file: str, src_mtime: Optional[float] = None,
+                backend: str = 'shutil', chunk_size: int = DEFAULT_CHUNK_SIZE,
+                resume: bool = False, expected_hash: Optional[str] = None,
+                link_dest: Optional[str] = None) -> CopyResult:
+    """Copy a file while hashing it, skipping it when its content is known
+
+    Drop-in replacement for copy_engine.copy_one used for hash change
+    detection. Timestamps are not trusted: a file is only skipped when it
+    hashes to expected_hash, the hash recorded for its last backup. The
+    hash of a copied file is computed from the same reads that copy it,
+    so the chunked loop is used whatever the backend.
+
+    Args:
+        link_dest (Optional[str]): In snapshot mode, the file's copy in the
+            previous snapshot. dst_file is in a new, empty tree, so a file
+            whose content is unchanged is hard-linked from there instead.
+
+    Returns:
+        CopyResult: (status, src_file, dst_file, error message or None, hash)
+    """
+    view = get_buffer(chunk_size)
+    try:
+        if expected_hash is not None:
+            digest = hash_file(src_file, chunk_size)
+            if digest == expected_hash:
+                if os.path.exists(dst_file):
+                    return SKIPPED, src_file, dst_file, None, digest
+                if link_dest is not None:
+                    try:
+                        os.link(link_dest, dst_file)
+                        return SKIPPED, src_file, dst_file, None, digest
+                    except OSError:
+                        # Gone from the previous snapshot or no hard links, copy it
+                        pass
+
+        status = UPDATED if os.path.exists(dst_file) else COPIED
+        part_file = dst_file + PART_SUFFIX
+        hasher = new_hasher()
+        with open(src_file, 'rb', buffering=0) as fsrc:
+            offset = 0
+            if resume:
+                try:
+                    offset = os.path.getsize(part_file)
+                except OSError:
+                    offset = 0
+                if offset > os.fstat(fsrc.fileno()).st_size:
+                    offset = 0
+            with open(part_file, 'r+b' if offset else 'wb', buffering=0) as fdst:
+                if offset:
+                    # Hash the part already copied from the local copy
+                    _hash_fd(_Limited(fdst, offset), hasher, view)
+                    fsrc.seek(offset)
+                    fdst.seek(offset)
+                    fdst.truncate()
+                _hash_fd(fsrc, hasher, view, fdst)
+        shutil.copystat(src_file, part_file)
+        os.replace(part_file, dst_file)
+        return status, src_file, dst_file, None, format_hash(hasher)
+    except Exception as e:
+        return FAILED, src_file, dst_file, str(e), None
+
+
+class _Limited:
+    """readinto view of the first limit bytes of a file"""
+    def __init__(self, f, limit: int):
+        self.f = f
+        self.remaining = limit
+
+    def readinto(self, view: memoryview) -> int:
+        if not self.remaining:
+            return 0
+        n = self.f.readinto(view[:min(len(view), self.remaining)])
+        self.remaining -= n
+        return n
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+from typing import Dict, Tuple
+from .logger import logger
+
+
+class Journal:
+    """On-disk journal of files a job has started but not finished
+
+    Before a file is copied its source size and mtime are recorded here,
+    and the copy is written to ``<dst>.usbbackup-part``. The entry is
+    dropped once the part file has been renamed into place. If the stick
+    is pulled or the copy is stopped, the next insertion finds the entry,
+    checks that the source is unchanged and appends to the part file from
+    where it stopped. Finished files are tracked by the device manifest.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.entries: Dict[str, Tuple[int, float]] = {}
+        self._conn = None
+
+    @staticmethod
+    def path_for(backup_dst: str, device_id: str) -> str:
+        """Get the journal file location for a device"""
+        return os.path.join(backup_dst, '.usbbackup', 'journals', f'{device_id}.db')
+
+    def open(self):
+        """Open the journal and load unfinished entries"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS partial ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL)'
+        )
+        self.entries = {
+            path: (size, mtime)
+            for path, size, mtime in self._conn.execute('SELECT path, size, mtime FROM partial')
+        }
+        if self.entries:
+            logger.info(f"Found {len(self.entries)} unfinished files from an interrupted backup")
+        return self
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def begin(self, rel_path: str, size: int, mtime: float) -> bool:
+        """Record that a file copy is starting
+
+        Returns:
+            bool: True if an earlier partial copy of the same source version
+            can be resumed
+        """
+        entry = self.entries.get(rel_path)
+        if entry == (size, mtime):
+            return True
+        self.entries[rel_path] = (size, mtime)
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO partial (path, size, mtime) VALUES (?, ?, ?)',
+                               (rel_path, size, mtime))
+        return False
+
+    def complete(self, rel_path: str):
+        """Drop the entry of a file that was renamed into place"""
+        if self.entries.pop(rel_path, None) is not None:
+            with self._conn:
+                self._conn.execute('DELETE FROM partial WHERE path = ?', (rel_path,))
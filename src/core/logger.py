@@ -1,7 +1,12 @@
+import atexit
 import logging
 import os
 import platform
+import queue
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict
 
 def get_log_directory():
     """Get the appropriate log directory based on the OS"""
@@ -27,24 +32,117 @@ def get_log_directory():
             xdg_data_home = os.path.join(home, '.local', 'share')
         return os.path.join(xdg_data_home, app_name.lower(), 'logs')
 
+# Flush the log file after this many records, or when the queue goes quiet
+FLUSH_BATCH = 100
+FLUSH_INTERVAL = 1.0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records as they are, so formatting happens on the listener thread"""
+    def prepare(self, record):
+        return record
+
+
+class BatchingQueueListener(QueueListener):
+    """Queue listener that flushes its handlers whenever the queue is idle"""
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, FLUSH_INTERVAL)
+            except queue.Empty:
+                for handler in self.handlers:
+                    force_flush = getattr(handler, 'force_flush', None)
+                    if force_flush is not None:
+                        force_flush()
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """Log file per day, also rotated when it grows past max_bytes
+    
+    Writes go to usb_backup_<date>.log, with .1, .2, ... for the parts
+    rotated out by size. Files older than keep_days are removed at start
+    and when the date changes. The stream is flushed every FLUSH_BATCH records instead
+    of after each one.
+    """
+    def __init__(self, log_dir: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 keep_days: int = 30):
+        self.log_dir = log_dir
+        self.keep_days = keep_days
+        self._date = datetime.now().strftime("%Y-%m-%d")
+        self._unflushed = 0
+        super().__init__(self._path_for(self._date), maxBytes=max_bytes,
+                         backupCount=backup_count, encoding='utf-8', delay=True)
+        # A process started and stopped within a day never sees the date change
+        self.prune()
+    
+    def _path_for(self, date_str: str) -> str:
+        return os.path.join(self.log_dir, f'usb_backup_{date_str}.log')
+    
+    def shouldRollover(self, record) -> bool:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        if date_str != self._date:
+            # New day, switch to a new file; it is opened by the next write
+            self._date = date_str
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(self._path_for(date_str))
+            self.prune()
+        return super().shouldRollover(record)
+    
+    def prune(self):
+        """Remove log files older than keep_days"""
+        if self.keep_days <= 0:
+            return
+        cutoff = time.time() - self.keep_days * 86400
+        with os.scandir(self.log_dir) as it:
+            for entry in it:
+                if entry.name.startswith('usb_backup_') and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+    
+    def flush(self):
+        # Called after every record, only flush once a batch is complete
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_BATCH:
+            self.force_flush()
+    
+    def force_flush(self):
+        self._unflushed = 0
+        super().flush()
+    
+    def close(self):
+        self.force_flush()
+        super().close()
+
+
+_listener = None
+
+
 def setup_logger():
-    """Configure and return a logger"""
+    """Configure and return a logger
+    
+    Records are put on a queue by the calling thread and written by a
+    listener thread, so copy workers never wait for the file or console.
+    """
+    global _listener
     # Create logger
     logger = logging.getLogger('USBBackup')
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(logging.INFO)
     
     # Clear existing handlers (in case of reload)
     if logger.hasHandlers():
         logger.handlers.clear()
+    stop_logging()
     
     # Create log directory in user's directory
     log_dir = get_log_directory()
     os.makedirs(log_dir, exist_ok=True)
     
-    # Create file handler with date in filename
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    log_file = os.path.join(log_dir, f'usb_backup_{date_str}.log')
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    # Create file handler rotating by date and size
+    file_handler = DailyRotatingFileHandler(log_dir)
     file_handler.setLevel(logging.INFO)
     
     # Create console handler
@@ -56,14 +154,45 @@ def setup_logger():
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Route records through a queue to the handlers
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    _listener = BatchingQueueListener(log_queue, file_handler, console_handler,
+                                      respect_handler_level=True)
+    _listener.start()
     
     # Log the log file location
-    logger.info(f"Logging to file: {log_file}")
+    logger.info(f"Logging to file: {file_handler.baseFilename}")
     
     return logger
 
+
+def stop_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def configure_logging(settings: Dict[str, Any]):
+    """Apply the log section of the configuration
+    
+    Without verbose, per-file DEBUG records are not even created; each
+    job logs a summary instead.
+    """
+    logger.setLevel(logging.DEBUG if settings.get('verbose') else logging.INFO)
+    if _listener is None:
+        return
+    for handler in _listener.handlers:
+        if isinstance(handler, DailyRotatingFileHandler):
+            handler.maxBytes = int(settings.get('max_bytes', handler.maxBytes))
+            handler.backupCount = int(settings.get('backup_count', handler.backupCount))
+            handler.keep_days = int(settings.get('keep_days', handler.keep_days))
+            handler.setLevel(logging.DEBUG if settings.get('verbose') else logging.INFO)
+
 # Create global logger instance
-logger = setup_logger() 
\ No newline at end of file
+logger = setup_logger()
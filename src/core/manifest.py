@@ -0,0 +1,100 @@
+import os
+import sqlite3
+from typing import Dict, Optional, Tuple
+from .logger import logger
+
+# Entry stored per file: (size, mtime, hash)
+ManifestEntry = Tuple[int, float, Optional[str]]
+
+
+class Manifest:
+    """Persistent per-device index of backed up files
+
+    One SQLite database per device ID records the size, mtime and optional
+    hash of every file that reached the backup. On re-insertion the copier
+    compares source stat results against this index instead of stat'ing
+    the destination tree. The whole table is loaded into memory on open,
+    and updates are written back in batches.
+    """
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.entries: Dict[str, ManifestEntry] = {}
+        self._dirty: Dict[str, ManifestEntry] = {}
+        self._conn = None
+
+    @staticmethod
+    def path_for(backup_dst: str, device_id: str, storage_mode: str = 'mirror') -> str:
+        """Get the manifest file location for a device
+
+        Archive mode keeps its own index: a file inside an archive is not a
+        file in the device tree, so switching modes must not skip either.
+        """
+        suffix = '.archive' if storage_mode == 'archive' else ''
+        return os.path.join(backup_dst, '.usbbackup', 'manifests', f'{device_id}{suffix}.db')
+
+    def open(self):
+        """Open the database and load all entries"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+            'mtime REAL NOT NULL, hash TEXT)'
+        )
+        self.entries = {
+            path: (size, mtime, file_hash)
+            for path, size, mtime, file_hash in self._conn.execute(
+                'SELECT path, size, mtime, hash FROM files')
+        }
+        logger.debug(f"Loaded {len(self.entries)} manifest entries from {self.db_path}")
+        return self
+
+    def close(self):
+        """Flush pending updates and close the database"""
+        if self._conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def get(self, rel_path: str) -> Optional[ManifestEntry]:
+        """Get the recorded entry for a file"""
+        return self.entries.get(rel_path)
+
+    def is_unchanged(self, rel_path: str, size: int, mtime: float) -> bool:
+        """Check if a source file matches what was last backed up"""
+        entry = self.entries.get(rel_path)
+        return entry is not None and entry[0] == size and entry[1] == mtime
+
+    def record(self, rel_path: str, size: int, mtime: float, file_hash: Optional[str] = None):
+        """Record a file as backed up"""
+        entry = (size, mtime, file_hash)
+        self.entries[rel_path] = entry
+        self._dirty[rel_path] = entry
+        if len(self._dirty) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write pending updates to disk"""
+        if not self._dirty or self._conn is None:
+            return
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)',
+                [(path, size, mtime, file_hash)
+                 for path, (size, mtime, file_hash) in self._dirty.items()]
+            )
+        self._dirty.clear()
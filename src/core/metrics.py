@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence
+from .logger import logger
+
+# Upper bounds in seconds, from a small file on an SSD to a stick that hangs
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class Counter:
+    """Value that only goes up"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets
+
+    Each observation is a binary search and three additions, so it is
+    fine per file in the copy loop.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        # One count per bound plus one for values above the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def _cumulative(self) -> List[int]:
+        with self._lock:
+            counts = list(self.counts)
+        total, cumulative = 0, []
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = self._cumulative()
+        return {'buckets': dict(zip([*map(str, self.bounds), '+Inf'], cumulative)),
+                'sum': self.sum, 'count': cumulative[-1]}
+
+    def render(self) -> List[str]:
+        cumulative = self._cumulative()
+        lines = [f'{self.name}_bucket{{le="{bound}"}} {count}'
+                 for bound, count in zip([*self.bounds, '+Inf'], cumulative)]
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {cumulative[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of this process, exported as Prometheus text or JSON"""
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._add(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str,
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        """Get all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all metrics as plain data"""
+        return {'time': time.time(),
+                'metrics': {name: metric.snapshot() for name, metric in self._metrics.items()}}
+
+    def write_json(self, path: str):
+        """Write a snapshot to path, replacing the previous one atomically"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+files_scanned = registry.counter('usbbackup_files_scanned_total',
+                                 'Files found by the pre-scan after whitelist filtering')
+files_copied = registry.counter('usbbackup_files_copied_total', 'Files copied or updated')
+files_skipped = registry.counter('usbbackup_files_skipped_total',
+                                 'Files left alone because the backup was up to date')
+files_failed = registry.counter('usbbackup_files_failed_total', 'Files that could not be copied')
+bytes_copied = registry.counter('usbbackup_bytes_copied_total', 'Bytes of copied or updated files')
+file_copy_seconds = registry.histogram('usbbackup_file_copy_seconds',
+                                       'Time a worker spent on one file')
+scan_seconds = registry.histogram('usbbackup_scan_seconds', 'Duration of a pre-scan',
+                                  DURATION_BUCKETS)
+queue_depth = registry.gauge('usbbackup_queue_depth', 'File copies queued or running')
+start_delay_seconds = registry.histogram('usbbackup_start_delay_seconds',
+                                         'Time from device detection to backup start',
+                                         DURATION_BUCKETS)
+jobs_total = registry.counter('usbbackup_jobs_total', 'Backup jobs run')
+
+
+_server = None
+_json_path = ''
+
+
+def start_server(port: int, host: str = '127.0.0.1'):
+    """Serve /metrics and /metrics.json on a daemon thread"""
+    # Imported here, most installs never enable the endpoint
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = registry.render(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(registry.snapshot()), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug("Metrics request: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def stop_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+def write_snapshot():
+    """Write the JSON snapshot file if one is configured"""
+    if not _json_path:
+        return
+    try:
+        registry.write_json(_json_path)
+    except OSError as e:
+        logger.warning(f"Failed to write metrics snapshot: {e}")
+
+
+def configure_metrics(settings: Dict[str, Any]):
+    """Apply the metrics section of the configuration
+
+    Metrics are always collected; port and json_path only decide whether
+    they are exported. The endpoint only listens on localhost.
+    """
+    global _server, _json_path
+    _json_path = os.path.expanduser(settings.get('json_path') or '')
+    port = int(settings.get('port') or 0)
+    if _server is not None and _server.server_port == port:
+        return
+    stop_server()
+    if port:
+        try:
+            _server = start_server(port)
+        except OSError as e:
+            logger.error(f"Failed to start metrics endpoint on port {port}: {e}")
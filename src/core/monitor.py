@@ -1,90 +1,117 @@
-import os
-import threading
-import time
-from typing import List, Set
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Set
+from .bridge import LoopBridge
 from .config import config
-from .usb_copier import USBCopier
+from .device_source import DeviceSource, create_device_source, device_events
+from .scheduler import BackupScheduler
 from .logger import logger
-import win32file
-import win32api
+from .platforms import PlatformBackend, get_platform
 
 class USBMonitor:
-    """USB device monitoring class"""
-    def __init__(self):
-        self.copier = USBCopier()
+    """USB device monitoring class
+
+    The monitor is a coroutine: device changes arrive as an async stream
+    and every new device becomes a scheduler task. Async callers (the
+    command line daemon) await run() and shutdown() on their own loop.
+    Synchronous callers (the tray) use start_monitor, stop_monitor,
+    stop_current_copy and close, which hand the work to a loop thread
+    through a LoopBridge and return at once.
+    """
+    def __init__(self, device_source: Optional[DeviceSource] = None,
+                 platform: Optional[PlatformBackend] = None):
+        settings = config.copy_settings
+        self.scheduler = BackupScheduler(settings['max_jobs'], settings['max_streams'])
+        self.device_source = device_source
+        self.platform = platform or get_platform()
         self.last_usb_drives: Set[str] = set()
-        self.monitoring = False
-        self.monitor_thread = None
+        # Device waits and scans block, one thread serves all devices
+        self._watcher = ThreadPoolExecutor(1, thread_name_prefix='device-watch')
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._bridge: Optional[LoopBridge] = None
         logger.info("USB monitor initialization complete")
-    
+
+    @property
+    def monitoring(self) -> bool:
+        return self._monitor_task is not None and not self._monitor_task.done()
+
     def get_usb_drives(self) -> Set[str]:
-        """Get all USB drives"""
-        drives = set()
-        for drive in range(ord('A'), ord('Z') + 1):
-            drive_letter = chr(drive) + ':'
-            if os.path.exists(drive_letter):
-                # Check if it's a USB drive
-                if self._is_usb_drive(drive_letter):
-                    drives.add(drive_letter)
-        return drives
-    
-    def _is_usb_drive(self, drive: str) -> bool:
-        """Check if drive is a USB device"""
+        """Get all USB drives (drive letters on Windows, mount points elsewhere)"""
+        return self.platform.get_usb_drives()
+
+    async def run(self):
+        """Back up every device inserted from now on, until cancelled"""
+        if self.device_source is None:
+            settings = config.monitor_settings
+            self.device_source = create_device_source(
+                self.get_usb_drives, settings['source'], settings['poll_interval'])
+        loop = asyncio.get_running_loop()
+        self.last_usb_drives = await loop.run_in_executor(self._watcher,
+                                                          self.device_source.get_drives)
+        logger.info(f"Initial USB devices: {', '.join(self.last_usb_drives) if self.last_usb_drives else 'none'}")
+
         try:
-            # Get drive volume information
-            drive_type = win32file.GetDriveType(drive)
-            return drive_type == win32file.DRIVE_REMOVABLE
-        except Exception as e:
-            logger.error(f"Failed to check drive type: {e}")
-            return False
-    
-    def detect_usb_change(self, current_drives: Set[str]) -> List[str]:
-        """Detect USB device changes, return list of newly added drives"""
-        added_drives = list(current_drives - self.last_usb_drives)
-        if added_drives:
-            logger.info(f"Detected new USB devices: {', '.join(added_drives)}")
-        return added_drives
-    
-    def start_monitor(self):
-        """Start monitoring with a thread"""
+            async for event in device_events(self.device_source, self._watcher,
+                                             set(self.last_usb_drives)):
+                if event.kind == 'added':
+                    logger.info(f"Starting to process USB device: {event.drive}")
+                    self.last_usb_drives.add(event.drive)
+                    self.scheduler.submit(event.drive)
+                else:
+                    logger.info(f"USB device removed: {event.drive}")
+                    self.last_usb_drives.discard(event.drive)
+                    # Its copy can only fail from here on
+                    self.scheduler.stop(event.drive)
+        except RuntimeError as e:
+            # The interpreter shuts the watcher down on exit without close()
+            logger.info(f"USB monitoring ended: {e}")
+
+    async def shutdown(self):
+        """Stop monitoring, stop all jobs and wait until they have ended"""
+        self._stop_task()
+        self.scheduler.stop_all()
+        await self.scheduler.join()
+        self.scheduler.close()
+        self._watcher.shutdown(wait=False)
+        if self.device_source is not None:
+            self.device_source.close()
+
+    def _start_task(self):
         if not self.monitoring:
-            self.monitoring = True
-            self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-            self.monitor_thread.start()
-            logger.info("USB monitoring thread started")
-    
-    def stop_monitor(self):
-        """Stop monitoring"""
+            self._monitor_task = asyncio.get_running_loop().create_task(self.run(),
+                                                                        name='usb-monitor')
+            logger.info("USB monitoring started")
+
+    def _stop_task(self):
         if self.monitoring:
-            self.monitoring = False
-            if self.monitor_thread:
-                self.monitor_thread.join(timeout=1.0)
+            self._monitor_task.cancel()
             logger.info("USB monitoring stopped")
-    
-    def _monitor_loop(self):
-        """Monitoring loop"""
-        self.last_usb_drives = self.get_usb_drives()
-        logger.info(f"Initial USB devices: {', '.join(self.last_usb_drives) if self.last_usb_drives else 'none'}")
-        
-        while self.monitoring:
-            current_drives = self.get_usb_drives()
-            added_drives = self.detect_usb_change(current_drives)
-            
-            if added_drives:
-                for drive in added_drives:
-                    if self.monitoring:  # Check again in case monitoring stopped during copy
-                        logger.info(f"Starting to process USB device: {drive}")
-                        self.copier.do_copy(drive)
-            
-            self.last_usb_drives = current_drives
-            
-            # Reduce CPU usage
-            for _ in range(10):
-                if not self.monitoring:
-                    break
-                time.sleep(0.1)
-    
+        self._monitor_task = None
+
+    def start_monitor(self):
+        """Start monitoring on the monitor's own event loop thread"""
+        if self._bridge is None:
+            self._bridge = LoopBridge()
+        self._bridge.call(self._start_task)
+
+    def stop_monitor(self):
+        """Stop monitoring; running backups go on"""
+        if self._bridge is not None:
+            self._bridge.call(self._stop_task).result()
+
     def stop_current_copy(self):
-        """Stop current copy operation"""
-        self.copier.stop_flag = True 
-        logger.info("Copy stop flag set") 
\ No newline at end of file
+        """Stop every running or waiting backup"""
+        if self._bridge is not None:
+            self._bridge.call(self.scheduler.stop_all)
+            logger.info("Copy stop requested")
+
+    def close(self, timeout: Optional[float] = None):
+        """Shut down from synchronous code, waiting up to timeout seconds"""
+        if self._bridge is None:
+            return
+        try:
+            self._bridge.submit(self.shutdown()).result(timeout)
+        except Exception as e:
+            logger.warning(f"Backups did not stop cleanly: {e}")
+        self._bridge.close(timeout)
+        self._bridge = None
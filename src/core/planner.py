@@ -0,0 +1,108 @@
+import os
+import shutil
+from typing import AbstractSet, Callable, List, Optional, Set, Tuple
+from .logger import logger
+from .scanner import ScanEntry
+
+# Space a file takes at least, whatever its size
+BLOCK_SIZE = 4096
+
+# order name -> sort key, None keeps the scan order
+ORDERS = {
+    'scan': None,
+    'small_first': lambda entry: entry.size,
+    'newest_first': lambda entry: -entry.mtime,
+}
+
+
+class InsufficientSpaceError(OSError):
+    """The destination can not hold the planned backup"""
+
+
+def order_entries(entries: List[ScanEntry], order: str = 'scan') -> List[ScanEntry]:
+    """Sort the planned copies so the most wanted files are copied first"""
+    if order not in ORDERS:
+        logger.warning(f"Unknown copy order '{order}', using 'scan'")
+        order = 'scan'
+    key = ORDERS[order]
+    return entries if key is None else sorted(entries, key=key)
+
+
+def space_needed(entry: ScanEntry) -> int:
+    """Get the bytes a copy of entry takes on disk, rounded up to whole blocks"""
+    return max(BLOCK_SIZE, -(-entry.size // BLOCK_SIZE) * BLOCK_SIZE)
+
+
+def already_present(entries: List[ScanEntry], dst_dir: str,
+                    known: Callable[[str], Optional[tuple]]) -> Set[str]:
+    """Find planned copies whose destination is already up to date
+
+    Files the manifest does not know are planned even when an earlier
+    backup (e.g. from before the manifest existed) already holds them.
+    Only those are checked, with one stat each.
+
+    Args:
+        known (Callable): Manifest lookup by relative path, None for unknown files
+
+    Returns:
+        Set[str]: Relative paths of entries that will not take any space
+    """
+    present = set()
+    for entry in entries:
+        if known(entry.rel_path) is not None:
+            continue
+        try:
+            st = os.stat(os.path.join(dst_dir, entry.rel_path))
+        except OSError:
+            continue
+        # Same rule as copy_one, which skips these without writing
+        if st.st_mtime >= entry.mtime:
+            present.add(entry.rel_path)
+    return present
+
+
+def fit_to_space(entries: List[ScanEntry], dst_dir: str, reserve: int = 0,
+                 policy: str = 'trim', present: AbstractSet[str] = frozenset()
+                 ) -> Tuple[List[ScanEntry], List[ScanEntry]]:
+    """Check the planned copies against the free space of the destination
+
+    The estimate is conservative: every copy is counted in full, even when
+    dedup, snapshots or delta updates end up writing less. Only entries in
+    present, already up to date at the destination, count as free.
+
+    Args:
+        entries (List[ScanEntry]): Planned copies, in copy order
+        dst_dir (str): Existing directory on the destination disk
+        reserve (int): Bytes to leave free
+        policy (str): 'trim' drops the files that do not fit, keeping the
+            order; 'refuse' raises instead
+        present (AbstractSet[str]): Relative paths found by already_present
+
+    Returns:
+        Tuple: (entries to copy, entries left out for lack of space)
+
+    Raises:
+        InsufficientSpaceError: If policy is 'refuse' and the plan does not fit
+    """
+    needed = sum(space_needed(entry) for entry in entries if entry.rel_path not in present)
+    available = shutil.disk_usage(dst_dir).free - reserve
+    if needed <= available:
+        return entries, []
+
+    message = (f"Backup needs {needed / 1024 ** 2:.1f} MB but only "
+               f"{max(0, available) / 1024 ** 2:.1f} MB are free on {dst_dir}")
+    if policy == 'refuse':
+        raise InsufficientSpaceError(message)
+    if policy != 'trim':
+        logger.warning(f"Unknown low space policy '{policy}', using 'trim'")
+
+    kept, left_out = [], []
+    for entry in entries:
+        size = 0 if entry.rel_path in present else space_needed(entry)
+        if size <= available:
+            kept.append(entry)
+            available -= size
+        else:
+            left_out.append(entry)
+    logger.warning(f"{message}, leaving out {len(left_out)} files")
+    return kept, left_out
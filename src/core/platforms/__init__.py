@@ -0,0 +1,95 @@
+"""
+平台相关模块
+按操作系统枚举可移动设备并读取卷标和序列号
+"""
+import os
+import sys
+from typing import Dict, NamedTuple, Optional, Set
+
+
+class DeviceInfo(NamedTuple):
+    """A mounted removable volume"""
+    mount_point: str  # Drive letter on Windows
+    device: str       # Block device, '' when unknown
+    label: str
+    serial: str
+    fs_type: str
+
+
+def format_serial(serial: int) -> str:
+    """Get the decimal form of a 32 bit volume serial number as Windows has it
+
+    pywin32 returns the serial as a signed 32 bit number and Windows device
+    IDs, so backup folder names, have always used that form. Other systems
+    use it too, so a stick keeps one backup folder everywhere.
+    """
+    serial &= 0xFFFFFFFF
+    return str(serial - (1 << 32) if serial & 0x80000000 else serial)
+
+
+class PlatformBackend:
+    """Device discovery for one operating system
+
+    Subclasses implement scan_devices, which finds every mounted removable
+    volume with its label and serial in a single pass.
+    """
+    def scan_devices(self) -> Dict[str, DeviceInfo]:
+        """Get mounted removable volumes by mount point"""
+        raise NotImplementedError
+
+    def get_usb_drives(self) -> Set[str]:
+        """Get the mount points of all removable volumes"""
+        return set(self.scan_devices())
+
+    def get_device_info(self, drive: str) -> Optional[DeviceInfo]:
+        """Get label and serial of the volume mounted at drive"""
+        return self.scan_devices().get(drive)
+
+    def get_device_id(self, drive: str) -> str:
+        """Get a stable identifier for the volume at drive
+
+        Volumes that are not known removable devices (any directory given
+        to the command line tool) are identified by their directory name.
+        """
+        info = self.get_device_info(drive)
+        if info is None:
+            return os.path.basename(os.path.normpath(drive)) or 'NoName'
+        return f"{info.label or 'NoName'}_{info.serial}"
+
+
+class VolumesBackend(PlatformBackend):
+    """macOS: every entry of /Volumes except the boot volume"""
+    def __init__(self, volumes_dir: str = '/Volumes'):
+        self.volumes_dir = volumes_dir
+
+    def scan_devices(self) -> Dict[str, DeviceInfo]:
+        devices = {}
+        try:
+            root_dev = os.stat('/').st_dev
+            with os.scandir(self.volumes_dir) as it:
+                for entry in it:
+                    st = entry.stat()
+                    if st.st_dev != root_dev:
+                        devices[entry.path] = DeviceInfo(entry.path, '', entry.name,
+                                                         str(st.st_dev), '')
+        except OSError:
+            pass
+        return devices
+
+
+_backend: Optional[PlatformBackend] = None
+
+
+def get_platform() -> PlatformBackend:
+    """Get the backend for the running operating system"""
+    global _backend
+    if _backend is None:
+        if sys.platform == 'win32':
+            from .windows import WindowsBackend
+            _backend = WindowsBackend()
+        elif sys.platform.startswith('linux'):
+            from .linux import LinuxBackend
+            _backend = LinuxBackend()
+        else:
+            _backend = VolumesBackend()
+    return _backend
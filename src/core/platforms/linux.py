@@ -0,0 +1,134 @@
+import os
+import re
+from typing import Dict, Iterator, Optional, Tuple
+from ..logger import logger
+from . import DeviceInfo, PlatformBackend, format_serial
+
+# Filesystems that never live on a removable block device
+_VIRTUAL_FS = {'proc', 'sysfs', 'tmpfs', 'devtmpfs', 'cgroup', 'cgroup2', 'overlay', 'squashfs'}
+
+
+def _unescape_mountinfo(value: str) -> str:
+    """Decode the octal escapes (\\040 for a space) used in mountinfo"""
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+
+
+def _unescape_udev(value: str) -> str:
+    """Decode the \\xHH escapes udev uses in /dev/disk link names"""
+    return re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), value)
+
+
+def volume_serial(uuid: str) -> str:
+    """Turn a filesystem UUID into the serial Windows reports for it
+
+    FAT and exFAT UUIDs (XXXX-XXXX) are the volume serial number, and
+    Windows shows the low 32 bits of the 64 bit NTFS serial. Converting
+    them to the same signed decimal number pywin32 gives keeps a stick's
+    backup folder the same on both systems. Other UUIDs are used as they are.
+    """
+    digits = uuid.replace('-', '')
+    if re.fullmatch(r'[0-9A-Fa-f]{8}|[0-9A-Fa-f]{16}', digits):
+        return format_serial(int(digits[-8:], 16))
+    return uuid
+
+
+class LinuxBackend(PlatformBackend):
+    """Removable block devices from sysfs and /proc/self/mountinfo
+
+    One scan reads the mount table once, resolves each mount's device
+    number through /sys/dev/block, and takes labels and UUIDs from the
+    udev links in /dev/disk. A device counts as removable if its disk has
+    the removable flag or hangs off a USB bus, which also catches USB
+    SSDs that report themselves as fixed. The paths are parameters so a
+    fake tree can stand in for the real system.
+    """
+    def __init__(self, sysfs_root: str = '/sys', mountinfo_path: str = '/proc/self/mountinfo',
+                 dev_disk_root: str = '/dev/disk'):
+        self.sysfs_root = sysfs_root
+        self.mountinfo_path = mountinfo_path
+        self.dev_disk_root = dev_disk_root
+
+    def scan_devices(self) -> Dict[str, DeviceInfo]:
+        labels = self._read_links('by-label')
+        uuids = self._read_links('by-uuid')
+        devices = {}
+        for dev_number, mount_point, fs_type in self._read_mounts():
+            sys_path = self._resolve_block(dev_number)
+            if sys_path is None or not self._is_removable(sys_path):
+                continue
+            name = os.path.basename(sys_path)
+            uuid = uuids.get(name)
+            serial = volume_serial(uuid) if uuid else (self._usb_serial(sys_path) or '0')
+            devices[mount_point] = DeviceInfo(mount_point, '/dev/' + name,
+                                              labels.get(name, ''), serial, fs_type)
+        return devices
+
+    def get_device_info(self, drive: str) -> Optional[DeviceInfo]:
+        return self.scan_devices().get(os.path.normpath(drive))
+
+    def _read_mounts(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield (major:minor, mount point, fs type) of block device mounts"""
+        try:
+            with open(self.mountinfo_path, encoding='utf-8', errors='surrogateescape') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            logger.error(f"Failed to read mount table: {e}")
+            return
+        for line in lines:
+            fields = line.split()
+            try:
+                separator = fields.index('-', 6)
+            except ValueError:
+                continue
+            dev_number, mount_point = fields[2], _unescape_mountinfo(fields[4])
+            fs_type = fields[separator + 1]
+            if fs_type in _VIRTUAL_FS or dev_number.startswith('0:'):
+                continue
+            yield dev_number, mount_point, fs_type
+
+    def _resolve_block(self, dev_number: str) -> Optional[str]:
+        """Get the sysfs directory of a block device from its major:minor"""
+        link = os.path.join(self.sysfs_root, 'dev', 'block', dev_number)
+        try:
+            return os.path.realpath(os.path.join(os.path.dirname(link), os.readlink(link)))
+        except OSError:
+            return None
+
+    def _is_removable(self, sys_path: str) -> bool:
+        # A partition's disk is its parent directory
+        disk_path = (os.path.dirname(sys_path)
+                     if os.path.exists(os.path.join(sys_path, 'partition')) else sys_path)
+        if '/usb' in disk_path:
+            return True
+        try:
+            with open(os.path.join(disk_path, 'removable')) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            return False
+
+    def _usb_serial(self, sys_path: str) -> Optional[str]:
+        """Get the serial of the USB device the block device belongs to"""
+        path = sys_path
+        while len(path) > len(self.sysfs_root):
+            try:
+                with open(os.path.join(path, 'serial')) as f:
+                    return f.read().strip() or None
+            except OSError:
+                path = os.path.dirname(path)
+        return None
+
+    def _read_links(self, kind: str) -> Dict[str, str]:
+        """Map device names (sdb1) to the names of their /dev/disk/<kind> links"""
+        links = {}
+        directory = os.path.join(self.dev_disk_root, kind)
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        target = os.readlink(entry.path)
+                    except OSError:
+                        continue
+                    links[os.path.basename(target)] = _unescape_udev(entry.name)
+        except OSError:
+            pass
+        return links
@@ -0,0 +1,43 @@
+import os
+from typing import Dict
+import win32api
+import win32file
+from ..logger import logger
+from . import DeviceInfo, PlatformBackend
+
+
+class WindowsBackend(PlatformBackend):
+    """Removable drive letters, with label and serial from the volume"""
+    def scan_devices(self) -> Dict[str, DeviceInfo]:
+        devices = {}
+        for drive in range(ord('A'), ord('Z') + 1):
+            drive_letter = chr(drive) + ':'
+            if not os.path.exists(drive_letter) or not self._is_usb_drive(drive_letter):
+                continue
+            try:
+                label, serial, _, _, fs_type = win32api.GetVolumeInformation(drive_letter + "\\")
+            except Exception as e:
+                logger.error(f"Failed to get volume information of {drive_letter}: {e}")
+                continue
+            devices[drive_letter] = DeviceInfo(drive_letter, drive_letter, label, str(serial),
+                                               fs_type)
+        return devices
+
+    def get_device_info(self, drive: str):
+        # Ask the one volume directly instead of scanning every letter
+        try:
+            label, serial, _, _, fs_type = win32api.GetVolumeInformation(drive + "\\")
+        except Exception as e:
+            logger.error(f"Failed to get USB device ID: {e}")
+            return None
+        return DeviceInfo(drive, drive, label, str(serial), fs_type)
+
+    def _is_usb_drive(self, drive: str) -> bool:
+        """Check if drive is a USB device"""
+        try:
+            # Get drive volume information
+            drive_type = win32file.GetDriveType(drive)
+            return drive_type == win32file.DRIVE_REMOVABLE
+        except Exception as e:
+            logger.error(f"Failed to check drive type: {e}")
+            return False
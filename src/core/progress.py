@@ -0,0 +1,161 @@
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from .logger import logger
+
+
+class ProgressSnapshot(NamedTuple):
+    """Immutable view of a job's progress, safe to hand to other threads"""
+    job_id: int
+    drive: str
+    device_id: str
+    files_total: int
+    bytes_total: int
+    files_done: int
+    bytes_done: int
+    rate: float  # Bytes per second, smoothed
+    eta: Optional[float]  # Seconds left, None while unknown
+    finished: bool
+
+    @property
+    def percent(self) -> float:
+        """Completion in percent, by bytes (by files for empty files)"""
+        if self.bytes_total:
+            return 100.0 * self.bytes_done / self.bytes_total
+        if self.files_total:
+            return 100.0 * self.files_done / self.files_total
+        return 100.0
+
+
+class JobProgress:
+    """Progress counters of one backup job
+
+    Only the job thread writes to it; other threads get snapshots through
+    the ProgressHub. Updates are plain integer additions, and a snapshot is
+    published at most every PUBLISH_INTERVAL seconds, so the copy loop pays
+    next to nothing for reporting.
+    """
+    PUBLISH_INTERVAL = 0.25
+    # Weight of the newest sample in the smoothed transfer rate
+    RATE_SMOOTHING = 0.3
+
+    _ids = itertools.count(1)
+
+    def __init__(self, drive: str, device_id: str, hub: 'ProgressHub'):
+        self.job_id = next(self._ids)
+        self.drive = drive
+        self.device_id = device_id
+        self.hub = hub
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.rate = 0.0
+        self.started_at = time.monotonic()
+        self._last_publish = 0.0
+        self._last_bytes = 0
+
+    def set_totals(self, files_total: int, bytes_total: int):
+        """Set the amount of work found by the pre-scan"""
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.started_at = time.monotonic()
+        self._last_publish = self.started_at
+        self.hub.publish(self.snapshot())
+
+    def advance(self, files: int, nbytes: int):
+        """Count finished work and publish if the last update is old enough"""
+        self.files_done += files
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        elapsed = now - self._last_publish
+        if elapsed >= self.PUBLISH_INTERVAL:
+            sample = (self.bytes_done - self._last_bytes) / elapsed
+            self.rate = sample if not self.rate else (
+                self.RATE_SMOOTHING * sample + (1 - self.RATE_SMOOTHING) * self.rate)
+            self._last_publish = now
+            self._last_bytes = self.bytes_done
+            self.hub.publish(self.snapshot())
+
+    def snapshot(self, finished: bool = False) -> ProgressSnapshot:
+        remaining = max(0, self.bytes_total - self.bytes_done)
+        eta = 0.0 if finished or not remaining else (remaining / self.rate if self.rate else None)
+        return ProgressSnapshot(self.job_id, self.drive, self.device_id,
+                                self.files_total, self.bytes_total,
+                                self.files_done, self.bytes_done,
+                                self.rate, eta, finished)
+
+    def finish(self, stats: Dict[str, int], stopped: bool) -> Dict[str, Any]:
+        """Publish the final snapshot and build the job summary
+
+        Args:
+            stats (Dict[str, int]): Per-status file counts from the copy engine
+            stopped (bool): True if the job was stopped before the end
+
+        Returns:
+            Dict[str, Any]: Structured summary of the job
+        """
+        elapsed = time.monotonic() - self.started_at
+        summary = {
+            'drive': self.drive,
+            'device_id': self.device_id,
+            'files_total': self.files_total,
+            'bytes_total': self.bytes_total,
+            'files_done': self.files_done,
+            'bytes_done': self.bytes_done,
+            'elapsed': round(elapsed, 3),
+            'average_rate': self.bytes_done / elapsed if elapsed > 0 else 0.0,
+            'stopped': stopped,
+        }
+        summary.update(stats)
+        self.hub.publish(self.snapshot(finished=True))
+        self.hub.publish_summary(summary)
+        return summary
+
+
+class ProgressHub:
+    """Thread-safe channel from copy jobs to whoever displays progress
+
+    Subscribers are called on the job's thread, so GUI code must hand the
+    snapshot over to its own thread (the tray does this with a Qt signal).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[ProgressSnapshot], None]] = []
+        self._summary_subscribers: List[Callable[[Dict[str, Any]], None]] = []
+
+    def subscribe(self, callback: Callable[[ProgressSnapshot], None]):
+        """Get progress snapshots, throttled to a few per second per job"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def subscribe_summary(self, callback: Callable[[Dict[str, Any]], None]):
+        """Get the structured summary of each finished job"""
+        with self._lock:
+            self._summary_subscribers.append(callback)
+
+    def start_job(self, drive: str, device_id: str) -> JobProgress:
+        return JobProgress(drive, device_id, self)
+
+    def publish(self, snapshot: ProgressSnapshot):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Progress subscriber failed: {e}")
+
+    def publish_summary(self, summary: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._summary_subscribers)
+        for callback in subscribers:
+            try:
+                callback(summary)
+            except Exception as e:
+                logger.error(f"Summary subscriber failed: {e}")
+
+
+# Create global progress hub instance
+progress_hub = ProgressHub()
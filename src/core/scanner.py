@@ -0,0 +1,78 @@
+import os
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+from .logger import logger
+
+
+class ScanEntry(NamedTuple):
+    """A source file found by the scanner"""
+    rel_path: str  # Path relative to the scanned root
+    path: str  # Full source path
+    size: int
+    mtime: float
+
+
+def scan(src_dir: str,
+         skip_dir: Optional[Callable[[str], bool]] = None,
+         skip_file: Optional[Callable[[str], bool]] = None,
+         should_stop: Optional[Callable[[], bool]] = None) -> Iterator[ScanEntry]:
+    """Lazily yield every file under src_dir
+
+    Uses os.scandir and the stat data cached on each DirEntry, so every
+    source file is stat'ed at most once (on Windows the directory listing
+    already carries it, so no extra call is made at all). Files of a
+    directory are yielded before its subdirectories are entered.
+
+    Args:
+        src_dir (str): Root directory to scan
+        skip_dir (Callable[[str], bool]): Return True to prune a directory by name
+        skip_file (Callable[[str], bool]): Return True to skip a file by name
+        should_stop (Callable[[], bool]): Return True to end the scan early
+
+    Yields:
+        ScanEntry: (relative path, full path, size, mtime)
+    """
+    stack = [('', src_dir)]
+    while stack:
+        if should_stop is not None and should_stop():
+            return
+        rel_dir, abs_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if skip_dir is None or not skip_dir(entry.name):
+                                subdirs.append((os.path.join(rel_dir, entry.name), entry.path))
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if skip_file is not None and skip_file(entry.name):
+                            continue
+                        st = entry.stat()
+                    except OSError as e:
+                        logger.error(f"Failed to stat {entry.path}: {e}")
+                        continue
+                    yield ScanEntry(os.path.join(rel_dir, entry.name), entry.path,
+                                    st.st_size, st.st_mtime)
+        except OSError as e:
+            logger.error(f"Failed to list directory {abs_dir}: {e}")
+            continue
+        # Reverse so directories are visited in listing order
+        stack.extend(reversed(subdirs))
+
+
+def count_files(src_dir: str, **kwargs) -> Tuple[int, int]:
+    """Count the files and bytes a scan would yield
+
+    Accepts the same filter arguments as scan().
+
+    Returns:
+        Tuple[int, int]: (number of files, total size in bytes)
+    """
+    files = 0
+    total_bytes = 0
+    for entry in scan(src_dir, **kwargs):
+        files += 1
+        total_bytes += entry.size
+    return files, total_bytes
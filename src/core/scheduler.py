@@ -0,0 +1,194 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from .config import config
+from .logger import logger
+from . import metrics
+from .usb_copier import USBCopier
+
+
+class StreamPool:
+    """Pool of concurrent I/O streams shared fairly between jobs
+
+    Every job writing to the same destination disk draws from one pool.
+    A job may hold at most its fair share of the streams (the pool size
+    divided by the number of active jobs), so a second stick is not
+    starved by one that started earlier.
+    """
+    def __init__(self, max_streams: int):
+        self.max_streams = max(1, int(max_streams))
+        self._cond = threading.Condition()
+        self._in_use: Dict[object, int] = {}
+
+    def register(self, job):
+        with self._cond:
+            self._in_use[job] = 0
+            self._cond.notify_all()
+
+    def unregister(self, job):
+        with self._cond:
+            self._in_use.pop(job, None)
+            self._cond.notify_all()
+
+    def _fair_share(self) -> int:
+        return max(1, math.ceil(self.max_streams / max(1, len(self._in_use))))
+
+    def acquire(self, job):
+        """Block until job may start another stream"""
+        with self._cond:
+            self._cond.wait_for(lambda: sum(self._in_use.values()) < self.max_streams
+                                and self._in_use[job] < self._fair_share())
+            self._in_use[job] += 1
+
+    def release(self, job):
+        with self._cond:
+            if job in self._in_use:
+                self._in_use[job] -= 1
+            self._cond.notify_all()
+
+    def lease(self, job) -> 'StreamLease':
+        """Get an acquire/release handle bound to a job"""
+        return StreamLease(self, job)
+
+
+class StreamLease:
+    """A job's handle on a StreamPool, passed to its copy engine"""
+    def __init__(self, pool: StreamPool, job):
+        self.pool = pool
+        self.job = job
+
+    def acquire(self):
+        self.pool.acquire(self.job)
+
+    def release(self):
+        self.pool.release(self.job)
+
+
+class BackupJob:
+    """Backup of one inserted device, run as an asyncio task"""
+    def __init__(self, drive: str):
+        self.drive = drive
+        self.copier = USBCopier()
+        self.task: Optional[asyncio.Task] = None
+        self.detected_at = time.monotonic()
+
+    def stop(self):
+        """Cancel the job; a copy in progress is stopped and then awaited"""
+        if self.task is not None:
+            self.task.cancel()
+
+
+class BackupScheduler:
+    """Run one backup job per inserted device on an asyncio event loop
+
+    Each job is a task, so any number of devices can wait for their turn
+    without holding a thread. At most max_jobs jobs copy at the same time,
+    each on one thread of a bounded executor, and all jobs writing to the
+    same destination disk share a pool of max_streams concurrent file
+    copies. Cancelling a job that waits for a slot ends it at once;
+    cancelling a running one stops its copy and waits until the copy has
+    closed its manifest and journal.
+
+    All methods must be called on the event loop's thread.
+    """
+    def __init__(self, max_jobs: int = 2, max_streams: int = 8):
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_streams = max_streams
+        self._job_slots = asyncio.Semaphore(self.max_jobs)
+        self._executor = ThreadPoolExecutor(self.max_jobs, thread_name_prefix='backup')
+        self._jobs: Dict[str, BackupJob] = {}
+        self._pools: Dict[int, StreamPool] = {}
+
+    @property
+    def active_jobs(self) -> int:
+        """Number of jobs that are running or waiting for a slot"""
+        return len(self._jobs)
+
+    def submit(self, drive: str) -> bool:
+        """Start a backup job for a drive
+
+        Returns:
+            bool: False if the drive already has a job
+        """
+        if drive in self._jobs:
+            logger.info(f"Backup of {drive} is already scheduled")
+            return False
+        job = self._jobs[drive] = BackupJob(drive)
+        job.task = asyncio.get_running_loop().create_task(
+            self._run_job(job), name=f"backup-{os.path.basename(drive) or drive}")
+        return True
+
+    def stop(self, drive: str):
+        """Stop the job of one drive, e.g. when it was removed"""
+        job = self._jobs.get(drive)
+        if job is not None:
+            job.stop()
+
+    def stop_all(self):
+        """Stop every running or waiting job"""
+        for job in list(self._jobs.values()):
+            job.stop()
+
+    async def join(self):
+        """Wait for the current jobs to end, e.g. after stop_all on shutdown"""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """Release the copy threads once no job is left"""
+        self._executor.shutdown(wait=False)
+
+    def _get_pool(self, backup_dst: str) -> StreamPool:
+        """Get the stream pool for the disk holding backup_dst"""
+        try:
+            os.makedirs(backup_dst, exist_ok=True)
+            device = os.stat(backup_dst).st_dev
+        except OSError:
+            device = -1
+        pool = self._pools.get(device)
+        if pool is None:
+            pool = self._pools[device] = StreamPool(self.max_streams)
+        return pool
+
+    async def _run_job(self, job: BackupJob) -> bool:
+        try:
+            if self._job_slots.locked():
+                logger.info(f"Backup of {job.drive} is waiting for a free job slot")
+            async with self._job_slots:
+                return await self._copy(job)
+        except asyncio.CancelledError:
+            logger.info(f"Backup of {job.drive} cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Backup of {job.drive} failed: {e}", exc_info=True)
+            return False
+        finally:
+            self._jobs.pop(job.drive, None)
+
+    async def _copy(self, job: BackupJob) -> bool:
+        pool = self._get_pool(config.backup_dst)
+        pool.register(job)
+        metrics.start_delay_seconds.observe(time.monotonic() - job.detected_at)
+        try:
+            copy = asyncio.get_running_loop().run_in_executor(
+                self._executor, job.copier.do_copy, job.drive, pool.lease(job))
+            try:
+                return await asyncio.shield(copy)
+            except asyncio.CancelledError:
+                job.copier.stop_current_copy()
+                # Workers notice the stop at their next chunk, the journal
+                # resumes the files they were copying. A second cancel (device
+                # removed and Stop clicked) must not end the job before that.
+                while not copy.done():
+                    try:
+                        await asyncio.shield(copy)
+                    except asyncio.CancelledError:
+                        pass
+                raise
+        finally:
+            pool.unregister(job)
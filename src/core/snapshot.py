@@ -0,0 +1,187 @@
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+from .copy_backend import PART_SUFFIX
+from .logger import logger
+
+SNAPSHOT_FORMAT = '%Y%m%d-%H%M%S'
+# Part files of interrupted copies, kept outside the snapshots for the next run
+PARTIAL_DIR = '.partial'
+
+
+class SnapshotStore:
+    """Timestamped backup trees of one device
+
+    Every run writes a new tree ``<device_dir>/<YYYYmmdd-HHMMSS>``. Files
+    unchanged since the latest snapshot are hard-linked from it instead of
+    copied (like rsync --link-dest), so a snapshot only costs the changed
+    bytes. A tree is built under a part name and renamed when the run
+    ends, so the latest finished snapshot is always a complete link source.
+    """
+    def __init__(self, device_dir: str):
+        self.device_dir = device_dir
+        self.partial_dir = os.path.join(device_dir, PARTIAL_DIR)
+
+    def list_snapshots(self) -> List[str]:
+        """Get the names of finished snapshots, oldest first"""
+        names = []
+        try:
+            with os.scandir(self.device_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False) and _parse_name(entry.name) is not None:
+                        names.append(entry.name)
+        except FileNotFoundError:
+            pass
+        return sorted(names)
+
+    def latest(self) -> Optional[str]:
+        """Get the path of the newest finished snapshot, None if there is none"""
+        names = self.list_snapshots()
+        return os.path.join(self.device_dir, names[-1]) if names else None
+
+    def begin(self) -> str:
+        """Create the part directory of a new snapshot
+
+        Part directories left by a crashed run are removed first, their
+        files may not match what the manifest recorded. Their part files
+        are stashed so the journal can still resume them.
+        """
+        os.makedirs(self.device_dir, exist_ok=True)
+        with os.scandir(self.device_dir) as it:
+            stale = [entry.path for entry in it if entry.name.endswith(PART_SUFFIX)]
+        for path in stale:
+            logger.info(f"Removing unfinished snapshot {path}")
+            self.stash_parts(path)
+            shutil.rmtree(path, ignore_errors=True)
+
+        name = time.strftime(SNAPSHOT_FORMAT)
+        while os.path.exists(os.path.join(self.device_dir, name)):
+            # Two runs within one second, take the next free timestamp
+            name = time.strftime(SNAPSHOT_FORMAT,
+                                 time.localtime(time.mktime(_parse_name(name)) + 1))
+        path = os.path.join(self.device_dir, name + PART_SUFFIX)
+        os.makedirs(path)
+        return path
+
+    def stash_parts(self, part_dir: str) -> int:
+        """Move the part files of unfinished copies out of a snapshot tree
+
+        Every run starts a new tree, so a part file left in the old one would
+        never be resumed. It is kept under the partial directory by its
+        relative path instead, where take_part finds it.
+
+        Returns:
+            int: Number of part files moved
+        """
+        moved = 0
+        for root, _, files in os.walk(part_dir):
+            for name in files:
+                if not name.endswith(PART_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                stash = os.path.join(self.partial_dir, os.path.relpath(path, part_dir))
+                try:
+                    os.makedirs(os.path.dirname(stash), exist_ok=True)
+                    os.replace(path, stash)
+                    moved += 1
+                except OSError as e:
+                    logger.warning(f"Failed to keep part file {path}: {e}")
+                    _remove(path)
+        return moved
+
+    def take_part(self, rel_path: str, dst_file: str, resume: bool):
+        """Move a stashed part file next to dst_file when the copy is resumed
+
+        A part file that will not be resumed is deleted, it no longer
+        matches the source.
+        """
+        stash = os.path.join(self.partial_dir, rel_path + PART_SUFFIX)
+        if not os.path.exists(stash):
+            return
+        if resume:
+            try:
+                os.replace(stash, dst_file + PART_SUFFIX)
+            except OSError as e:
+                logger.warning(f"Failed to restore part file {stash}: {e}")
+        _remove(stash)
+        try:
+            # Drop directories the stash no longer needs
+            os.removedirs(os.path.dirname(stash))
+        except OSError:
+            pass
+
+    def commit(self, part_dir: str) -> str:
+        """Rename a part directory into a finished snapshot
+
+        Part files are stashed first, a snapshot only holds finished files.
+        """
+        self.stash_parts(part_dir)
+        path = part_dir[:-len(PART_SUFFIX)]
+        os.replace(part_dir, path)
+        logger.info(f"Snapshot finished: {path}")
+        return path
+
+    def prune(self, policy: Dict[str, Any]) -> List[str]:
+        """Delete snapshots no longer kept by the retention policy
+
+        Args:
+            policy (Dict[str, Any]): keep_last, keep_daily, keep_weekly and
+                keep_monthly counts, 0 disables a rule. With every rule at 0
+                nothing is pruned.
+
+        Returns:
+            List[str]: Names of the deleted snapshots
+        """
+        names = self.list_snapshots()
+        keep = select_kept(names, policy)
+        removed = [name for name in names if name not in keep]
+        for name in removed:
+            logger.info(f"Pruning snapshot {name}")
+            # Hard links keep data alive for the snapshots that still use it
+            shutil.rmtree(os.path.join(self.device_dir, name), ignore_errors=True)
+        return removed
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _parse_name(name: str) -> Optional[time.struct_time]:
+    try:
+        return time.strptime(name, SNAPSHOT_FORMAT)
+    except ValueError:
+        return None
+
+
+def select_kept(names: List[str], policy: Dict[str, Any]) -> set:
+    """Pick the snapshots a retention policy keeps
+
+    keep_last keeps the newest N snapshots. keep_daily, keep_weekly and
+    keep_monthly keep the newest snapshot of each of the last N days,
+    weeks and months that have one. The newest snapshot is always kept.
+    """
+    rules = {
+        'keep_daily': '%Y-%m-%d',
+        'keep_weekly': '%G-%V',
+        'keep_monthly': '%Y-%m',
+    }
+    if not any(int(policy.get(key) or 0) for key in ('keep_last', *rules)):
+        return set(names)
+
+    newest_first = sorted(names, reverse=True)
+    keep = set(newest_first[:max(1, int(policy.get('keep_last') or 0))])
+    for key, period_format in rules.items():
+        count = int(policy.get(key) or 0)
+        periods = set()
+        for name in newest_first:
+            if len(periods) >= count:
+                break
+            period = time.strftime(period_format, _parse_name(name))
+            if period not in periods:
+                periods.add(period)
+                keep.add(name)
+    return keep
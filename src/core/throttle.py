@@ -0,0 +1,215 @@
+import ctypes
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Optional
+from .logger import logger
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting a byte rate
+
+    A rate of 0 means unlimited. The bucket holds at most one second worth
+    of tokens, so short bursts are allowed but the average stays at rate.
+    """
+    def __init__(self, rate: float):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self._tokens = self.rate
+        self._last = time.monotonic()
+        self.unlimited = False
+
+    def consume(self, amount: int):
+        """Take amount tokens, sleeping until enough have accumulated"""
+        if self.rate <= 0 or self.unlimited:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Going into debt lets callers use chunks larger than the bucket
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Throttle:
+    """Read and write budgets applied by the copy backends"""
+    def __init__(self, read_rate: float = 0, write_rate: float = 0):
+        self.read_bucket = TokenBucket(read_rate)
+        self.write_bucket = TokenBucket(write_rate)
+
+    @property
+    def active(self) -> bool:
+        return self.read_bucket.rate > 0 or self.write_bucket.rate > 0
+
+    def read(self, nbytes: int):
+        self.read_bucket.consume(nbytes)
+
+    def write(self, nbytes: int):
+        self.write_bucket.consume(nbytes)
+
+    def set_unlimited(self, unlimited: bool):
+        """Lift (or restore) the limits, e.g. while the system is idle"""
+        self.read_bucket.unlimited = unlimited
+        self.write_bucket.unlimited = unlimited
+
+
+# Throttle of this process, shared by all jobs so the budget is global
+_throttle = Throttle()
+
+
+def get_throttle() -> Optional[Throttle]:
+    """Get the process throttle, None when copies are not limited"""
+    return _throttle if _throttle.active else None
+
+
+def get_process_throttle() -> Throttle:
+    """Get the process throttle even while it is inactive"""
+    return _throttle
+
+
+def configure(read_rate: float = 0, write_rate: float = 0, low_priority: bool = False):
+    """Set up throttling for the current process or worker
+
+    Also used as executor initializer, so process workers get their own
+    budget and priority.
+    """
+    _throttle.read_bucket.rate = float(read_rate)
+    _throttle.write_bucket.rate = float(write_rate)
+    if low_priority:
+        lower_current_thread_priority()
+
+
+def lower_current_thread_priority():
+    """Put the calling thread into background CPU and I/O priority"""
+    try:
+        if sys.platform == 'win32':
+            # THREAD_MODE_BACKGROUND_BEGIN lowers CPU, I/O and memory priority
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00010000)
+        elif sys.platform.startswith('linux'):
+            tid = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, tid, 19)
+            _set_linux_ioprio_idle(tid)
+        elif hasattr(os, 'nice'):
+            os.nice(19)
+    except Exception as e:
+        logger.warning(f"Failed to lower copy thread priority: {e}")
+
+
+# ioprio_set syscall numbers by machine
+_IOPRIO_SET = {'x86_64': 251, 'i686': 289, 'i386': 289, 'aarch64': 30, 'armv7l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def _set_linux_ioprio_idle(tid: int):
+    syscall_nr = _IOPRIO_SET.get(platform.machine())
+    if syscall_nr is None:
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall_nr, _IOPRIO_WHO_PROCESS, tid,
+                    _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) != 0:
+        raise OSError(ctypes.get_errno(), 'ioprio_set failed')
+
+
+class IdleWatcher:
+    """Lift the throttle while the machine is idle
+
+    Samples system activity every interval seconds: CPU idle time from
+    /proc/stat on Linux, time since the last user input on Windows. Once
+    the system is idle the throttle is lifted so overnight backups run at
+    full speed, and it is restored as soon as activity comes back.
+    """
+    def __init__(self, throttle: Throttle, idle_threshold: float = 0.9,
+                 user_idle_seconds: float = 300, interval: float = 2.0):
+        self.throttle = throttle
+        self.idle_threshold = idle_threshold
+        self.user_idle_seconds = user_idle_seconds
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_cpu = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='idle-watcher')
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        self.throttle.set_unlimited(False)
+
+    def _run(self):
+        idle = False
+        while not self._stop.wait(self.interval):
+            now_idle = self.is_idle()
+            if now_idle != idle:
+                idle = now_idle
+                self.throttle.set_unlimited(idle)
+                logger.info(f"System is {'idle, lifting' if idle else 'busy, restoring'} copy throttle")
+
+    def is_idle(self) -> bool:
+        if sys.platform == 'win32':
+            return self._user_idle_time() >= self.user_idle_seconds
+        if sys.platform.startswith('linux'):
+            return self._cpu_idle_ratio() >= self.idle_threshold
+        return False
+
+    def _cpu_idle_ratio(self) -> float:
+        with open('/proc/stat') as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+        # iowait is not idle: a disk-bound foreground app is when the limits matter most
+        idle, total = values[3], sum(values)
+        last, self._last_cpu = self._last_cpu, (idle, total)
+        if last is None or total == last[1]:
+            return 0.0
+        return (idle - last[0]) / (total - last[1])
+
+    @staticmethod
+    def _user_idle_time() -> float:
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+        info = LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return 0.0
+        return (ctypes.windll.kernel32.GetTickCount() - info.dwTime) / 1000.0
+
+
+# One watcher per process, it owns the process throttle while any job runs
+_watcher_lock = threading.Lock()
+_watcher: Optional[IdleWatcher] = None
+_watcher_users = 0
+
+
+def acquire_idle_watcher() -> IdleWatcher:
+    """Start the process idle watcher, or join the one already running
+
+    Jobs share it like they share the throttle, so one job ending does not
+    restore the limits under a job that is still running.
+    """
+    global _watcher, _watcher_users
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = IdleWatcher(_throttle)
+            _watcher.start()
+        _watcher_users += 1
+        return _watcher
+
+
+def release_idle_watcher():
+    """Leave the process idle watcher, the last job stops it"""
+    global _watcher, _watcher_users
+    with _watcher_lock:
+        _watcher_users -= 1
+        if _watcher_users > 0 or _watcher is None:
+            return
+        _watcher.stop()
+        _watcher = None
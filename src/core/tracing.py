@@ -0,0 +1,286 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial, wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .logger import logger
+
+class _TraceLocal(threading.local):
+    # A class default, a missing attribute would cost an exception per lookup
+    tracer: Optional['Tracer'] = None
+
+
+# Tracer of the job running on this thread, None when tracing is off
+_local = _TraceLocal()
+_NULL_SPAN = nullcontext()
+# Only one cProfile session can be active per process (Python 3.12+ refuses
+# a second one), jobs running alongside trace without it
+_cprofile_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.events.append((self.name, self.start, time.perf_counter(),
+                                   threading.get_ident(), self.args))
+        return False
+
+
+class Tracer:
+    """Span timings of one backup job
+
+    Spans are kept as tuples while the job runs and only turned into
+    Chrome trace events (chrome://tracing, Perfetto, speedscope) when the
+    job ends. Functions called once per file or directory are not given a
+    span each; timed() adds up their time and call count instead.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.thread = threading.get_ident()
+        # Worker threads are gone by the time the trace is written
+        self.thread_names = {self.thread: threading.current_thread().name}
+        # (name, start, end, thread id, args)
+        self.events: List[Tuple[str, float, float, int, Optional[Dict[str, Any]]]] = []
+        # name -> [seconds, calls]
+        self.totals: Dict[str, List[float]] = {}
+
+    def span(self, name: str, args: Optional[Dict[str, Any]] = None) -> _Span:
+        return _Span(self, name, args)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        total = self.totals.setdefault(name, [0.0, 0])
+        clock = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                total[0] += clock() - start
+                total[1] += 1
+        return wrapper
+
+    def phase_times(self) -> Dict[str, float]:
+        """Get the seconds spent in each span of the job thread, by name"""
+        phases: Dict[str, float] = {}
+        for name, start, end, thread, _ in sorted(self.events, key=lambda event: event[1]):
+            if thread == self.thread:
+                phases[name] = phases.get(name, 0.0) + end - start
+        return phases
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Get the spans in the Chrome trace event format"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                   'args': {'name': self.thread_names.get(tid, str(tid))}}
+                  for tid in {event[3] for event in self.events}]
+        for name, start, end, tid, args in self.events:
+            event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'job': self.name,
+                              'totals': {name: {'seconds': seconds, 'calls': calls}
+                                         for name, (seconds, calls) in self.totals.items()}}}
+
+
+def span(name: str, **args):
+    """Time a block as a span of the current job, a no-op when not tracing"""
+    tracer = _local.tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, args or None)
+
+
+def timed(name: str, func: Callable) -> Callable:
+    """Add up the time spent in func, returns func itself when not tracing"""
+    tracer = _local.tracer
+    if tracer is None:
+        return func
+    return tracer.timed(name, func)
+
+
+def _run_traced(tracer: Tracer, task: Callable, src_file: str, *args, **kwargs):
+    if _local.tracer is not tracer:
+        _local.tracer = tracer
+        tracer.thread_names[threading.get_ident()] = threading.current_thread().name
+    with tracer.span('copy file', {'file': src_file}):
+        return task(src_file, *args, **kwargs)
+
+
+def traced_task(task: Callable, executor: str) -> Callable:
+    """Wrap a copy task so every file it handles gets its own span
+
+    Only thread workers can report to the job's tracer; with the process
+    executor the copy loop's spans are all there is.
+    """
+    tracer = _local.tracer
+    if tracer is None or executor != 'thread':
+        return task
+    return partial(_run_traced, tracer, task)
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads, written in the speedscope format
+
+    Unlike cProfile it also sees the copy workers, and its cost does not
+    grow with the number of function calls.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_ids: Dict[Tuple[str, str, int], int] = {}
+        # thread id -> (samples, weights)
+        self.samples: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+        self.names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self.started = self.ended = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.ended = time.perf_counter()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self._frame_ids[key] = len(self.frames)
+            self.frames.append({'name': code.co_name, 'file': code.co_filename,
+                                'line': code.co_firstlineno})
+        return frame_id
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                samples, weights = self.samples.setdefault(tid, ([], []))
+                samples.append(stack)
+                weights.append(now - last)
+            last = now
+            for thread in threading.enumerate():
+                self.names.setdefault(thread.ident, thread.name)
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        profiles = [{'type': 'sampled', 'name': self.names.get(tid, str(tid)), 'unit': 'seconds',
+                     'startValue': 0, 'endValue': self.ended - self.started,
+                     'samples': samples, 'weights': weights}
+                    for tid, (samples, weights) in self.samples.items()]
+        return {'$schema': 'https://www.speedscope.app/file-format-schema.json',
+                'shared': {'frames': self.frames}, 'profiles': profiles,
+                'name': name, 'exporter': 'usbbackup'}
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+@contextmanager
+def trace_job(name: str, settings: Dict[str, Any], trace_dir: str) -> Iterator[Optional[Tracer]]:
+    """Trace a backup job run on this thread if the trace settings enable it
+
+    Writes <name>-<time>.trace.json (Chrome trace) to trace_dir, plus
+    .prof (cProfile) or .speedscope.json (sampling, all threads) when a
+    profiler is chosen, and logs where the time went. cProfile sees the
+    job thread only before Python 3.12 and every thread of the process
+    after, so it profiles one job at a time.
+    """
+    if not settings.get('enabled'):
+        yield None
+        return
+
+    tracer = Tracer(name)
+    profiler_name = settings.get('profiler') or 'none'
+    profiler = None
+    if profiler_name == 'cprofile':
+        if _cprofile_lock.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Another profiling tool is active outside this module
+                _cprofile_lock.release()
+                logger.warning(f"cProfile unavailable, tracing {name} without it: {e}")
+                profiler = None
+        else:
+            logger.warning(f"cProfile is busy with another job, tracing {name} without it")
+    elif profiler_name == 'sampling':
+        profiler = SamplingProfiler(float(settings.get('sample_interval') or 0.005))
+        profiler.start()
+    elif profiler_name != 'none':
+        logger.warning(f"Unknown profiler '{profiler_name}', tracing without one")
+
+    _local.tracer = tracer
+    try:
+        with tracer.span('backup', {'job': name}):
+            yield tracer
+    finally:
+        _local.tracer = None
+        if profiler_name == 'cprofile':
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+        elif profiler is not None:
+            profiler.stop()
+        _save_trace(tracer, profiler, trace_dir)
+
+
+def _save_trace(tracer: Tracer, profiler, trace_dir: str):
+    stamp = os.path.join(trace_dir, f"{tracer.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    base, serial = stamp, 1
+    while os.path.exists(base + '.trace.json'):
+        serial += 1
+        base = f"{stamp}-{serial}"
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        _write_json(base + '.trace.json', tracer.chrome_trace())
+        written = [base + '.trace.json']
+        if isinstance(profiler, SamplingProfiler):
+            _write_json(base + '.speedscope.json', profiler.speedscope(tracer.name))
+            written.append(base + '.speedscope.json')
+        elif profiler is not None:
+            profiler.dump_stats(base + '.prof')
+            written.append(base + '.prof')
+    except OSError as e:
+        logger.error(f"Failed to write trace: {e}")
+        written = []
+
+    phases = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in tracer.phase_times().items())
+    totals = ', '.join(f"{name} {seconds:.3f}s in {calls} calls"
+                       for name, (seconds, calls) in tracer.totals.items())
+    logger.info(f"Trace of {tracer.name}: {phases}" + (f" ({totals})" if totals else ""))
+    if written:
+        logger.info(f"Trace written to {', '.join(written)}")
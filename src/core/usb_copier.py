@@ -1,27 +1,59 @@
+import multiprocessing
 import os
-import shutil
-from typing import List, Set
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Set
+from .archive import ArchiveWriter, get_format
+from .blob_store import BlobStore, store_one
 from .config import config
+from .copy_backend import CopyStopped, DirCache, remove_part
+from .copy_engine import CopyEngine, FAILED, SKIPPED, copy_one
+from .delta import delta_one
+from .hashing import copy_hashed, is_content_hash
+from .journal import Journal
 from .logger import logger
-import win32api
+from .manifest import Manifest
+from . import metrics
+from .planner import InsufficientSpaceError, already_present, fit_to_space, order_entries
+from .progress import JobProgress, progress_hub
+from .scanner import ScanEntry, scan
+from .snapshot import SnapshotStore
+from . import throttle, tracing
+from .platforms import get_platform
+from .whitelist import WhitelistFilter
 
 class USBCopier:
     """USB copier class"""
     def __init__(self):
-        self.stop_flag = False
+        # Set from other threads (tray, signal handler, scheduler) to stop the job
+        self._stop = threading.Event()
+        # Stop event shared with process workers while they copy
+        self._worker_stop = None
+        # Summary of the most recent job, see JobProgress.finish
+        self.last_summary: Optional[Dict[str, Any]] = None
     
     def get_usb_device_id(self, drive: str) -> str:
         """Get unique identifier for USB device"""
         try:
-            volume_name = win32api.GetVolumeInformation(drive + "\\")[0] or "NoName"
-            volume_serial = win32api.GetVolumeInformation(drive + "\\")[1]
-            return f"{volume_name}_{volume_serial}"
+            return get_platform().get_device_id(drive)
         except Exception as e:
             logger.error(f"Failed to get USB device ID: {e}")
             return os.path.basename(drive)
     
-    def do_copy(self, drive: str) -> bool:
-        """Execute copy operation"""
+    @property
+    def stop_flag(self) -> bool:
+        """True once a stop was requested for the current job"""
+        return self._stop.is_set()
+    
+    def do_copy(self, drive: str, streams=None) -> bool:
+        """Execute copy operation
+        
+        Args:
+            drive (str): Drive or mount point to back up
+            streams: Optional shared stream limit from the backup scheduler
+        """
+        metrics.jobs_total.inc()
         try:
             # Get whitelist configuration
             white_list = config.white_list
@@ -35,73 +67,404 @@ class USBCopier:
             os.makedirs(backup_dir, exist_ok=True)
             
             logger.info(f"Starting to copy files from {drive} (ID: {device_id}) to {backup_dir}")
-            # Copy files
-            self._copy_files(drive, backup_dir, white_list)
+            # Copy files, deciding re-copies from the device manifest and
+            # resuming large files left unfinished by an interrupted backup
+            with tracing.trace_job(device_id, config.trace_settings, self._trace_dir()), \
+                    Manifest(Manifest.path_for(config.backup_dst, device_id,
+                                              config.storage_mode)) as manifest, \
+                    Journal(Journal.path_for(config.backup_dst, device_id)) as journal:
+                progress = progress_hub.start_job(drive, device_id)
+                try:
+                    self.last_summary = self._run_storage_mode(drive, backup_dir, white_list,
+                                                               manifest, journal, progress, streams)
+                except InsufficientSpaceError as e:
+                    logger.error(f"Backup refused: {e}")
+                    # Close the job so progress displays do not wait for it
+                    self.last_summary = progress.finish(
+                        {'copied': 0, 'updated': 0, 'skipped': 0, 'failed': 0}, stopped=False)
+                    return False
             logger.info(f"Copy completed: {drive} -> {backup_dir}")
             return True
         except Exception as e:
             logger.error(f"Copy failed: {e}")
             return False
         finally:
-            self.stop_flag = False
+            self._stop.clear()
+            metrics.write_snapshot()
+    
+    def _trace_dir(self) -> str:
+        """Get the directory trace files are written to"""
+        return (config.trace_settings['dir'] or
+                os.path.join(config.backup_dst, '.usbbackup', 'traces'))
+    
+    def _run_storage_mode(self, drive: str, backup_dir: str, white_list: dict,
+                          manifest: Manifest, journal: Journal, progress: JobProgress,
+                          streams=None) -> Dict[str, Any]:
+        """Back up drive with the configured storage mode"""
+        if config.storage_mode == 'archive':
+            return self._archive_files(drive, backup_dir, white_list, manifest, progress, streams)
+        if config.storage_mode == 'snapshot':
+            return self._snapshot_files(drive, backup_dir, white_list, manifest, journal,
+                                        progress, streams)
+        return self._copy_files(drive, backup_dir, white_list, manifest, journal, progress,
+                                streams)
     
     def stop_current_copy(self):
         """Stop current copy operation"""
-        self.stop_flag = True
+        self._stop.set()
+        worker_stop = self._worker_stop
+        if worker_stop is not None:
+            worker_stop.set()
         logger.info("Copy operation will be stopped at next opportunity")
     
-    def _copy_files(self, src_dir: str, dst_dir: str, white_list: dict):
-        """Recursively copy files"""
-        for root, dirs, files in os.walk(src_dir):
+    def _get_copy_task(self):
+        """Get the per-file worker function for the configured storage mode"""
+        storage_mode = config.storage_mode
+        if storage_mode == 'dedup':
+            return partial(store_one, blob_root=BlobStore.path_for_backup(config.backup_dst))
+        if storage_mode not in ('mirror', 'snapshot'):
+            logger.warning(f"Unknown storage mode '{storage_mode}', using 'mirror'")
+        task = copy_hashed if self._hash_detection() else copy_one
+        settings = config.copy_settings
+        if storage_mode == 'mirror' and settings['delta_min_size'] > 0:
+            # Large files that changed are updated block by block in place
+            return partial(delta_one, sig_root=os.path.join(config.backup_dst, '.usbbackup',
+                                                            'signatures'),
+                           min_size=settings['delta_min_size'],
+                           block_size=settings['delta_block_size'],
+                           fallback=task, trust_mtime=task is copy_one)
+        return task
+    
+    def _hash_detection(self) -> bool:
+        """Check if changes are detected by content hash instead of mtime"""
+        return (config.copy_settings['change_detection'] == 'hash' and
+                config.storage_mode in ('mirror', 'snapshot'))
+    
+    def _setup_throttle(self, settings: Dict[str, Any]):
+        """Apply bandwidth limits and priority for a job
+        
+        Returns:
+            Tuple: (worker initializer, its arguments, idle watcher or None);
+                a watcher is shared by all jobs and given back with
+                throttle.release_idle_watcher()
+        """
+        limits = config.throttle_settings
+        read_limit, write_limit = limits['read_limit'], limits['write_limit']
+        low_priority = limits['low_priority']
+        # Configures this process and lowers the priority of the job thread
+        throttle.configure(read_limit, write_limit, low_priority)
+        
+        if settings['executor'] == 'process':
+            # Each worker process gets an equal part of the budget
+            workers = max(1, int(settings['workers']))
+            initializer = throttle.configure
+            initargs = (read_limit / workers, write_limit / workers, low_priority)
+        else:
+            initializer = throttle.lower_current_thread_priority if low_priority else None
+            initargs = ()
+        
+        idle_watcher = None
+        if limits['idle_unthrottle'] and throttle.get_throttle() is not None:
+            idle_watcher = throttle.acquire_idle_watcher()
+        return initializer, initargs, idle_watcher
+    
+    def _plan(self, src_dir: str, white_list: dict, manifest: Manifest):
+        """Pre-scan: find the files that need copying so progress has totals
+        
+        Returns:
+            Tuple: (entries to copy, entries unchanged since the last backup)
+        """
+        start = time.monotonic()
+        whitelist = WhitelistFilter(white_list)
+        # Per-file calls are only added up when tracing, not given spans
+        skip_dir = tracing.timed('whitelist', whitelist.skip_dir)
+        skip_file = tracing.timed('whitelist', whitelist.skip_file)
+        is_unchanged = tracing.timed('manifest lookup', manifest.is_unchanged)
+        pending = []
+        unchanged = []
+        with tracing.span('scan', src_dir=src_dir):
+            for entry in scan(src_dir, skip_dir=skip_dir, skip_file=skip_file,
+                              should_stop=lambda: self.stop_flag):
+                if is_unchanged(entry.rel_path, entry.size, entry.mtime):
+                    unchanged.append(entry)
+                else:
+                    pending.append(entry)
+        metrics.scan_seconds.observe(time.monotonic() - start)
+        metrics.files_scanned.inc(len(pending) + len(unchanged))
+        return pending, unchanged
+    
+    def _preflight(self, pending: List[ScanEntry], dst_dir: str,
+                   manifest: Optional[Manifest] = None):
+        """Order the planned copies and make sure they fit on the destination
+        
+        Args:
+            manifest (Optional[Manifest]): Device manifest, given when files
+                land at their relative path under dst_dir; files it does not
+                know that are already there take no space
+        
+        Returns:
+            Tuple: (entries to copy in order, entries left out for lack of space)
+        """
+        settings = config.copy_settings
+        with tracing.span('preflight'):
+            pending = order_entries(pending, settings['order'])
+            present = (already_present(pending, dst_dir, manifest.get)
+                       if manifest is not None else frozenset())
+            return fit_to_space(pending, dst_dir, settings['reserve_bytes'],
+                                settings['on_low_space'], present)
+    
+    def _snapshot_files(self, src_dir: str, device_dir: str, white_list: dict,
+                        manifest: Manifest, journal: Journal, progress: JobProgress,
+                        streams=None) -> Dict[str, Any]:
+        """Back up into a new snapshot, hard-linking unchanged files from the last one
+        
+        Returns:
+            Dict[str, Any]: Summary of the job, also published to progress subscribers
+        """
+        snapshots = SnapshotStore(device_dir)
+        previous = snapshots.latest()
+        snapshot_dir = snapshots.begin()
+        summary = self._copy_files(src_dir, snapshot_dir, white_list, manifest, journal,
+                                   progress, streams, link_dest=previous,
+                                   snapshots=snapshots)
+        # A stopped run still gives a usable snapshot: unchanged files are
+        # linked before anything is copied, the rest is copied next time
+        with tracing.span('commit snapshot'):
+            snapshots.commit(snapshot_dir)
+            snapshots.prune(config.snapshot_settings)
+        return summary
+    
+    def _link_unchanged(self, entries: List[ScanEntry], link_dest: Optional[str],
+                        dst_dir: str) -> List[ScanEntry]:
+        """Hard-link unchanged files from the previous snapshot
+        
+        The previous copy must still match the manifest's size and mtime,
+        so a snapshot never links a stale version.
+        
+        Returns:
+            List[ScanEntry]: Entries that could not be linked and must be copied
+        """
+        missing = []
+        dirs = DirCache()
+        for entry in entries:
             if self.stop_flag:
-                logger.info("Copy operation stopped")
                 break
-            
-            # Check if directory name is in whitelist
-            rel_path = os.path.relpath(root, src_dir)
-            if rel_path != '.':
-                dir_parts = rel_path.split(os.sep)
-                if any(part in white_list['dirname'] for part in dir_parts):
-                    continue
-            
-            # Create destination directory
-            dst_root = os.path.join(dst_dir, rel_path)
-            os.makedirs(dst_root, exist_ok=True)
-            
-            # Copy files
-            for file in files:
-                if self.stop_flag:
-                    logger.info("Copy operation stopped")
-                    break
-                
-                # Check if filename and extension are in whitelist
-                filename = os.path.basename(file)
-                file_ext = os.path.splitext(file)[1].lower()
-                
-                if (filename in white_list['filename'] or 
-                    file_ext in white_list['suffix']):
+            if link_dest is None:
+                missing.append(entry)
+                continue
+            old_file = os.path.join(link_dest, entry.rel_path)
+            dst_file = os.path.join(dst_dir, entry.rel_path)
+            try:
+                st = os.stat(old_file)
+                if st.st_size != entry.size or abs(st.st_mtime - entry.mtime) > 1e-3:
+                    missing.append(entry)
                     continue
+                dirs.ensure(os.path.dirname(dst_file))
+                os.link(old_file, dst_file)
+            except OSError:
+                # Not in the previous snapshot, or the filesystem has no hard links
+                missing.append(entry)
+        return missing
+    
+    def _copy_files(self, src_dir: str, dst_dir: str, white_list: dict, manifest: Manifest,
+                    journal: Journal, progress: JobProgress, streams=None,
+                    link_dest: Optional[str] = None,
+                    snapshots: Optional[SnapshotStore] = None) -> Dict[str, Any]:
+        """Recursively copy files
+        
+        Args:
+            link_dest (Optional[str]): In snapshot mode, the previous snapshot to
+                hard-link unchanged files from (None for the first snapshot)
+            snapshots (Optional[SnapshotStore]): In snapshot mode, where the part
+                files of interrupted copies are kept between runs
+        
+        Returns:
+            Dict[str, Any]: Summary of the job, also published to progress subscribers
+        """
+        def on_result(result, entry):
+            # Only files that reached the destination go into the manifest,
+            # failed large ones stay in the journal so their part file is resumed
+            status = result[0]
+            if status != FAILED:
+                manifest.record(entry.rel_path, entry.size, entry.mtime, result[4])
+                if entry.size >= resume_min_size:
+                    journal.complete(entry.rel_path)
+                if status == SKIPPED:
+                    metrics.files_skipped.inc()
                 else:
-                    src_file = os.path.join(root, file)
-                    dst_file = os.path.join(dst_root, file)
+                    metrics.files_copied.inc()
+                    metrics.bytes_copied.inc(entry.size)
+            else:
+                metrics.files_failed.inc()
+                if entry.size < resume_min_size:
+                    # Not journaled, nothing would ever resume or delete it
+                    remove_part(result[2])
+            progress.advance(1, entry.size)
+        
+        settings = config.copy_settings
+        resume_min_size = settings['resume_min_size']
+        hash_detection = self._hash_detection()
+        pending, unchanged = self._plan(src_dir, white_list, manifest)
+        if config.storage_mode == 'snapshot':
+            with tracing.span('link unchanged', files=len(unchanged)):
+                relinked = self._link_unchanged(unchanged, link_dest, dst_dir)
+            unchanged = len(unchanged) - len(relinked)
+            pending.extend(relinked)
+        else:
+            unchanged = len(unchanged)
+        metrics.files_skipped.inc(unchanged)
+        pending, left_out = self._preflight(pending, dst_dir, manifest)
+        progress.set_totals(len(pending), sum(entry.size for entry in pending))
+        
+        # Workers check the stop once per chunk instead of once per file
+        stop_event = self._stop
+        if settings['executor'] == 'process':
+            # Worker processes cannot see a threading.Event
+            stop_event = self._worker_stop = multiprocessing.Event()
+            if self.stop_flag:
+                stop_event.set()
+        # Started last: the idle watcher is a thread only the finally below stops
+        initializer, initargs, idle_watcher = self._setup_throttle(settings)
+        engine = CopyEngine(workers=settings['workers'], executor=settings['executor'],
+                            should_stop=lambda: self.stop_flag, on_result=on_result,
+                            backend=settings['backend'], chunk_size=settings['chunk_size'],
+                            task=tracing.traced_task(self._get_copy_task(),
+                                                     settings['executor']),
+                            streams=streams,
+                            initializer=initializer, initargs=initargs,
+                            stop_event=stop_event)
+        dirs = DirCache()
+        small_file_size = settings['small_file_size']
+        batch_files = max(1, int(settings['batch_files']))
+        batch, batch_tags = [], []
+        try:
+            with tracing.span('copy', files=len(pending), backend=engine.backend), engine:
+                for entry in pending:
+                    if self.stop_flag:
+                        break
+                    
+                    # Create destination directory when its first file shows up
+                    dst_file = os.path.join(dst_dir, entry.rel_path)
+                    dirs.ensure(os.path.dirname(dst_file))
                     
-                    if os.path.exists(dst_file):
-                        # Check if destination file is newer than source file
-                        src_mtime = os.path.getmtime(src_file)
-                        dst_mtime = os.path.getmtime(dst_file)
-                        
-                        if src_mtime > dst_mtime:
-                            try:
-                                shutil.copy2(src_file, dst_file)
-                                logger.debug(f"Updated: {src_file} -> {dst_file}")
-                            except Exception as e:
-                                logger.error(f"Failed to update file {src_file}: {e}")
-                        else:
-                            logger.debug(f"Skipped: {src_file} (destination is newer)")
- 
-                    else:
+                    task_kwargs = {}
+                    if hash_detection:
+                        # Same size but a new mtime: only recopy if the content differs
+                        known = manifest.get(entry.rel_path)
+                        task_kwargs['expected_hash'] = (
+                            known[2] if known and known[0] == entry.size and
+                            is_content_hash(known[2]) else None)
+                        if link_dest is not None and task_kwargs['expected_hash']:
+                            task_kwargs['link_dest'] = os.path.join(link_dest, entry.rel_path)
+                    
+                    # Small files are copied in batches, one worker call per batch
+                    if entry.size <= small_file_size:
+                        batch.append((entry.path, dst_file, entry.mtime, False, task_kwargs))
+                        batch_tags.append(entry)
+                        if len(batch) >= batch_files:
+                            engine.submit_batch(batch, batch_tags)
+                            batch, batch_tags = [], []
+                        continue
+                    
+                    # Only large files are journaled, small ones are cheap to redo
+                    resume = (entry.size >= resume_min_size and
+                              journal.begin(entry.rel_path, entry.size, entry.mtime))
+                    if snapshots is not None and entry.size >= resume_min_size:
+                        snapshots.take_part(entry.rel_path, dst_file, resume)
+                    if resume:
+                        logger.info(f"Resuming interrupted copy of {entry.path}")
+                    engine.submit(entry.path, dst_file, entry, src_mtime=entry.mtime,
+                                  resume=resume, **task_kwargs)
+                if batch and not self.stop_flag:
+                    engine.submit_batch(batch, batch_tags)
+        finally:
+            self._worker_stop = None
+            if idle_watcher is not None:
+                throttle.release_idle_watcher()
+            stopped = self.stop_flag
+            stats = dict(engine.stats, skipped=engine.stats['skipped'] + unchanged,
+                         left_out=len(left_out))
+            summary = progress.finish(stats, stopped)
+        if stopped:
+            logger.info("Copy operation stopped")
+        logger.info(f"Copy summary: {stats['copied']} copied, {stats['updated']} updated, "
+                    f"{stats['skipped']} skipped, {stats['failed']} failed, "
+                    f"{summary['bytes_done'] / 1024 ** 2:.1f} MB in {summary['elapsed']:.1f}s")
+        if left_out:
+            logger.warning(f"{len(left_out)} files were left out for lack of space")
+        return summary
+    
+    def _archive_files(self, src_dir: str, dst_dir: str, white_list: dict, manifest: Manifest,
+                       progress: JobProgress, streams=None) -> Dict[str, Any]:
+        """Stream new and changed files into one compressed archive for this run
+        
+        Returns:
+            Dict[str, Any]: Summary of the job, also published to progress subscribers
+        """
+        settings = config.copy_settings
+        archive_settings = config.archive_settings
+        pending, unchanged = self._plan(src_dir, white_list, manifest)
+        metrics.files_skipped.inc(len(unchanged))
+        pending, left_out = self._preflight(pending, dst_dir)
+        progress.set_totals(len(pending), sum(entry.size for entry in pending))
+        stats = {'copied': 0, 'updated': 0, 'skipped': len(unchanged), 'failed': 0,
+                 'left_out': len(left_out)}
+        
+        fmt = get_format(archive_settings['format'])
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        archive_path = os.path.join(dst_dir, f"{stamp}.{fmt}")
+        serial = 1
+        while os.path.exists(archive_path):
+            serial += 1
+            archive_path = os.path.join(dst_dir, f"{stamp}-{serial}.{fmt}")
+        archived = []
+        # Compression threads get the same priority treatment as copy threads
+        initializer, _, idle_watcher = self._setup_throttle(dict(settings, executor='thread'))
+        if streams is not None:
+            streams.acquire()
+        try:
+            if pending:
+                with tracing.span('archive', files=len(pending)), \
+                        ArchiveWriter(archive_path, fmt, archive_settings['level'],
+                                      workers=settings['workers'],
+                                      frame_size=archive_settings['frame_size'],
+                                      read_size=settings['chunk_size'],
+                                      initializer=initializer,
+                                      stop_event=self._stop) as archive:
+                    for entry in pending:
+                        if self.stop_flag:
+                            break
                         try:
-                            shutil.copy2(src_file, dst_file)
-                            logger.debug(f"Copied: {src_file} -> {dst_file}")
-                        except Exception as e:
-                            logger.error(f"Failed to copy file {src_file}: {e}") 
\ No newline at end of file
+                            archive.add(entry.path, entry.rel_path)
+                            archived.append(entry)
+                            metrics.files_copied.inc()
+                            metrics.bytes_copied.inc(entry.size)
+                            logger.debug("Archived: %s", entry.path)
+                        except CopyStopped:
+                            # Files archived so far still make a valid archive
+                            logger.info(f"Stopped archiving {entry.path}, it is archived next time")
+                            break
+                        except OSError as e:
+                            stats['failed'] += 1
+                            metrics.files_failed.inc()
+                            logger.error(f"Failed to archive {entry.path}: {e}")
+                        progress.advance(1, entry.size)
+                # Only files of a finished archive count as backed up
+                for entry in archived:
+                    manifest.record(entry.rel_path, entry.size, entry.mtime)
+                stats['copied'] = len(archived)
+        finally:
+            if streams is not None:
+                streams.release()
+            if idle_watcher is not None:
+                throttle.release_idle_watcher()
+            stopped = self.stop_flag
+            summary = progress.finish(stats, stopped)
+        if stopped:
+            logger.info("Copy operation stopped")
+        logger.info(f"Archive summary: {stats['copied']} archived, "
+                    f"{stats['skipped']} skipped, {stats['failed']} failed, "
+                    f"{summary['bytes_done'] / 1024 ** 2:.1f} MB in {summary['elapsed']:.1f}s")
+        if left_out:
+            logger.warning(f"{len(left_out)} files were left out for lack of space")
+        return summary
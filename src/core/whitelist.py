@@ -0,0 +1,128 @@
+import fnmatch
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern
+from .logger import logger
+
+# Rules starting with this prefix are regular expressions
+REGEX_PREFIX = 're:'
+_GLOB_CHARS = set('*?[')
+# Characters that are literal at the start of a regex when not quantified
+_REGEX_LITERAL_START = set('_-~ ')
+_GLOBAL_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+
+
+def _combine(patterns: List[str], flags: int) -> Optional[Pattern]:
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), flags)
+
+
+class _RuleSet:
+    """Rules of one whitelist category
+
+    Literal names go into a set. Glob and regex rules are translated into
+    regexes and bucketed by their first literal character, each bucket
+    compiled into one combined expression, so a name only runs against
+    the few patterns that could possibly match it.
+    """
+    def __init__(self, rules: Iterable[str], ignore_case: bool = False):
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+        self.literals = set()
+        buckets: Dict[str, List[str]] = {}
+        anywhere: List[str] = []
+        for rule in rules:
+            rule = str(rule)
+            if rule.startswith(REGEX_PREFIX):
+                source = rule[len(REGEX_PREFIX):]
+                try:
+                    re.compile(source)
+                except re.error as e:
+                    logger.error(f"Ignoring invalid whitelist regex '{source}': {e}")
+                    continue
+                first = self._regex_first_char(source)
+                # Leading global flags such as (?i) must become scoped to combine rules
+                flags_match = _GLOBAL_FLAGS.match(source)
+                if flags_match:
+                    pattern = f'(?{flags_match.group(1)}:{source[flags_match.end():].lstrip("^")})\\Z'
+                else:
+                    pattern = f'(?:{source.lstrip("^")})\\Z'
+            elif _GLOB_CHARS & set(rule):
+                first = rule[0] if rule[0] not in _GLOB_CHARS else None
+                pattern = fnmatch.translate(rule)
+            else:
+                self.literals.add(rule.lower() if ignore_case else rule)
+                continue
+            if first is None:
+                anywhere.append(pattern)
+            else:
+                buckets.setdefault(self._key(first), []).append(pattern)
+        self._anywhere = _combine(anywhere, flags)
+        self._buckets = {key: _combine(patterns, flags) for key, patterns in buckets.items()}
+
+    def _key(self, char: str) -> str:
+        return char.lower() if self.ignore_case else char
+
+    @staticmethod
+    def _regex_first_char(source: str) -> Optional[str]:
+        """Get the literal character a regex must start with, if there is one"""
+        source = source.lstrip('^')
+        if not source or '|' in source:
+            return None
+        first = source[0]
+        if not (first.isalnum() or first in _REGEX_LITERAL_START):
+            return None
+        if len(source) > 1 and source[1] in '?*{':
+            return None
+        return first
+
+    def match(self, name: str) -> bool:
+        if (name.lower() if self.ignore_case else name) in self.literals:
+            return True
+        if not name:
+            return False
+        bucket = self._buckets.get(self._key(name[0]))
+        if bucket is not None and bucket.match(name) is not None:
+            return True
+        return self._anywhere is not None and self._anywhere.match(name) is not None
+
+
+class WhitelistFilter:
+    """Whitelist compiled once per backup job
+
+    Rules can be plain names, globs (``*.tmp``) or regular expressions
+    (``re:^~\\$.*``). Matching cost stays flat as the rule lists grow:
+    plain names are set lookups, and suffix results are cached since a
+    stick only holds a handful of distinct extensions. Directory rules
+    are applied by the scanner, which prunes the whole subtree.
+    """
+    SUFFIX_CACHE_SIZE = 4096
+
+    def __init__(self, white_list: Dict[str, List[str]]):
+        self._dirnames = _RuleSet(white_list.get('dirname') or [])
+        self._filenames = _RuleSet(white_list.get('filename') or [])
+        # Suffixes are compared lowercased and with the leading dot
+        self._suffixes = _RuleSet(
+            (s if str(s).startswith(('.', REGEX_PREFIX)) or _GLOB_CHARS & set(str(s)) else '.' + str(s)
+             for s in white_list.get('suffix') or []),
+            ignore_case=True)
+        self._suffix_cache: Dict[str, bool] = {}
+
+    def skip_dir(self, name: str) -> bool:
+        """Check if a directory (and everything below it) is whitelisted"""
+        return self._dirnames.match(name)
+
+    def skip_file(self, name: str) -> bool:
+        """Check if a file is whitelisted by its name or suffix"""
+        if self._filenames.match(name):
+            return True
+        suffix = os.path.splitext(name)[1].lower()
+        if not suffix:
+            return False
+        skip = self._suffix_cache.get(suffix)
+        if skip is None:
+            skip = self._suffixes.match(suffix)
+            if len(self._suffix_cache) < self.SUFFIX_CACHE_SIZE:
+                self._suffix_cache[suffix] = skip
+        return skip
@@ -169,7 +169,8 @@ class ConfigEditorGUI(QMainWindow):
     
     def add_list_item(self, list_widget, item_type):
         """添加列表项"""
-        text, ok = QInputDialog.getText(self, f'添加{item_type}', f'请输入{item_type}:')
+        text, ok = QInputDialog.getText(self, f'添加{item_type}',
+                                        f'请输入{item_type}（支持 * ? 通配符，正则表达式以 re: 开头）:')
         if ok and text:
             list_widget.addItem(text)
     
@@ -189,14 +190,16 @@ class ConfigEditorGUI(QMainWindow):
     def save_config(self):
         """保存配置到YAML文件"""
         # 构建新的配置数据
-        config_data = {
+        # 保留编辑器中未展示的配置项（如 copy）
+        config_data = dict(config.config)
+        config_data.update({
             'backup_dst': self.backup_path_edit.text(),
             'white_list': {
                 'dirname': [self.dirname_list.item(i).text() for i in range(self.dirname_list.count())],
                 'filename': [self.filename_list.item(i).text() for i in range(self.filename_list.count())],
                 'suffix': [self.suffix_list.item(i).text() for i in range(self.suffix_list.count())]
             }
-        }
+        })
         
         # 保存配置
         if config.save_config(config_data):
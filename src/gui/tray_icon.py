@@ -19,6 +19,8 @@ class TrayIcon(QObject):
         super().__init__()
         self.app = app
         self.config_editor = None
+        # Latest progress snapshot of each running copy job
+        self.copy_jobs = {}
         
         # Ensure system supports tray icons
         if not QSystemTrayIcon.isSystemTrayAvailable():
@@ -211,4 +213,53 @@ class TrayIcon(QObject):
             self.stop_copy_action.setEnabled(True)
         else:
             self.copy_status_action.setText("Copy: Idle")
-            self.stop_copy_action.setEnabled(False) 
\ No newline at end of file
+            self.stop_copy_action.setEnabled(False)
+            self.tray_icon.setToolTip("USB Backup Tool") 
+    
+    def update_copy_progress(self, snapshot):
+        """Update copy status display from a progress snapshot
+        
+        Args:
+            snapshot (ProgressSnapshot): Progress of one copy job, must be
+                delivered on the GUI thread
+        """
+        if snapshot.finished:
+            self.copy_jobs.pop(snapshot.job_id, None)
+        else:
+            self.copy_jobs[snapshot.job_id] = snapshot
+        
+        if not self.copy_jobs:
+            self.update_copy_status(False)
+            return
+        
+        # Combine all running jobs into one line
+        jobs = list(self.copy_jobs.values())
+        files_done = sum(job.files_done for job in jobs)
+        files_total = sum(job.files_total for job in jobs)
+        bytes_done = sum(job.bytes_done for job in jobs)
+        bytes_total = sum(job.bytes_total for job in jobs)
+        rate = sum(job.rate for job in jobs)
+        percent = 100.0 * bytes_done / bytes_total if bytes_total else 0.0
+        etas = [job.eta for job in jobs]
+        eta = 'unknown' if None in etas else self._format_duration(max(etas))
+        
+        prefix = f"Copy ({len(jobs)} devices)" if len(jobs) > 1 else "Copy"
+        self.copy_status_action.setText(
+            f"{prefix}: {percent:.0f}% - {files_done}/{files_total} files, "
+            f"{self._format_bytes(rate)}/s, ETA {eta}")
+        self.stop_copy_action.setEnabled(True)
+        self.tray_icon.setToolTip(f"USB Backup Tool\n{self.copy_status_action.text()}")
+    
+    @staticmethod
+    def _format_bytes(size: float) -> str:
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+    
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -23,17 +23,17 @@ if os.path.abspath(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from .gui.tray_icon import TrayIcon
     from .core.monitor import USBMonitor
-    from .core.usb_copier import USBCopier
     from .core.config import Config
     from .gui.icons import get_icon, get_resource_path
     from .core.config import Config
+    from .core.progress import progress_hub
 except ImportError:
     from src.gui.tray_icon import TrayIcon
     from src.core.monitor import USBMonitor
-    from src.core.usb_copier import USBCopier
     from src.core.config import Config
     from src.gui.icons import get_icon, get_resource_path
     from src.core.logger import logger
+    from src.core.progress import progress_hub
 
 class AutoStartManager:
     """Manages application autostart functionality"""
@@ -151,6 +151,9 @@ class SingleInstanceChecker:
 
 class USBBackupApp(QObject):
     """USB backup application main class"""
+    # Carries progress snapshots from copy threads to the GUI thread
+    copy_progress = pyqtSignal(object)
+    
     def __init__(self):
         super().__init__()
         
@@ -201,7 +204,6 @@ class USBBackupApp(QObject):
         
         # Initialize components
         self.config = Config()
-        self.usb_copier = USBCopier()
         self.monitor = USBMonitor()
         
         # Initialize autostart manager
@@ -215,6 +217,8 @@ class USBBackupApp(QObject):
         self.tray_icon.copy_stopped.connect(self.stop_current_copy)
         self.tray_icon.app_exit.connect(self.exit_app)
         self.tray_icon.autostart_toggled.connect(self.set_autostart)
+        self.copy_progress.connect(self.tray_icon.update_copy_progress)
+        progress_hub.subscribe(self.copy_progress.emit)
         
         # Initialize autostart status
         autostart_enabled = self.is_autostart_enabled()
@@ -246,13 +250,14 @@ class USBBackupApp(QObject):
     
     def stop_current_copy(self):
         """Stop current copy operation"""
-        self.usb_copier.stop_current_copy()
+        self.monitor.stop_current_copy()
         logger.info("Requested to stop current copy operation")
     
     def exit_app(self):
         """Exit application"""
         logger.info("Application is exiting")
-        self.monitor.stop_monitor()
+        # Stop running backups so manifests and journals are closed cleanly
+        self.monitor.close(timeout=10)
         self.app.quit()
     
     def run(self):
@@ -326,8 +331,6 @@ def main():
 # TODO 配置文件保存到系统目录，更新版本后自动读取默认配置文件
 # TODO 优化更新方式，能否在软件中自动拉取更新
 # TODO 日志文件按日期保存
-# TODO 正则白名单
-# FIXME Copy:Idle 状态没有变化
 # TODO 配置文件和日志存放在一起
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file
@@ -0,0 +1,60 @@
+import asyncio
+
+from src.core.device_source import FakeDeviceSource
+from src.core.monitor import USBMonitor
+
+
+class RecordingScheduler:
+    """Stands in for BackupScheduler, records what the monitor asks of it"""
+    def __init__(self):
+        self.calls = []
+        self.changed = asyncio.Event()
+
+    def submit(self, drive):
+        self.calls.append(('submit', drive))
+        self.changed.set()
+        return True
+
+    def stop(self, drive):
+        self.calls.append(('stop', drive))
+        self.changed.set()
+
+    def stop_all(self):
+        pass
+
+    async def join(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def _next_call(scheduler):
+    await asyncio.wait_for(scheduler.changed.wait(), 5)
+    scheduler.changed.clear()
+    return scheduler.calls[-1]
+
+
+def test_insert_and_remove_reach_the_scheduler():
+    async def run():
+        source = FakeDeviceSource(['/media/present'])
+        monitor = USBMonitor(device_source=source)
+        scheduler = monitor.scheduler = RecordingScheduler()
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        assert monitor.last_usb_drives == {'/media/present'}
+
+        source.insert('/media/stick')
+        assert await _next_call(scheduler) == ('submit', '/media/stick')
+        assert monitor.last_usb_drives == {'/media/present', '/media/stick'}
+
+        source.remove('/media/stick')
+        assert await _next_call(scheduler) == ('stop', '/media/stick')
+        assert monitor.last_usb_drives == {'/media/present'}
+
+        # Drives present at start are not backed up
+        assert ('submit', '/media/present') not in scheduler.calls
+        task.cancel()
+        await monitor.shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from src.core.platforms import DeviceInfo, format_serial
+from src.core.platforms.linux import (LinuxBackend, _unescape_mountinfo, _unescape_udev,
+                                      volume_serial)
+
+USB_PORT = 'devices/pci0000:00/0000:00:14.0/usb2/2-1'
+USB_DISK = USB_PORT + '/2-1:1.0/host6/target6:0:0/6:0:0:0/block/sdb'
+SATA_DISK = 'devices/pci0000:00/0000:00:17.0/ata1/host0/target0:0:0/0:0:0:0/block/sda'
+CARD_DISK = 'devices/platform/soc/mmc0/mmc0:0001/block/mmcblk0'
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+23 22 0:5 / /proc rw,nosuid shared:2 - proc proc rw
+24 22 8:17 / /media/user/My\\040Stick rw,nosuid shared:3 - vfat /dev/sdb1 rw
+25 22 179:0 / /media/card rw,nosuid shared:4 - exfat /dev/mmcblk0 rw
+26 22 8:33 / /media/nolabel rw,nosuid shared:5 - ext4 /dev/sdc1 rw
+"""
+
+
+def _write(path, content=''):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _link(link, target):
+    link.parent.mkdir(parents=True, exist_ok=True)
+    os.symlink(target, link)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    sysfs = tmp_path / 'sys'
+    # USB SSD that reports itself as fixed, found through its USB path
+    _write(sysfs / USB_DISK / 'removable', '0\n')
+    _write(sysfs / USB_DISK / 'sdb1' / 'partition', '1\n')
+    _write(sysfs / USB_PORT / 'serial', 'AA0011223344\n')
+    # Internal disk
+    _write(sysfs / SATA_DISK / 'removable', '0\n')
+    _write(sysfs / SATA_DISK / 'sda1' / 'partition', '1\n')
+    # Card reader without a partition table, only the removable flag
+    _write(sysfs / CARD_DISK / 'removable', '1\n')
+    # Second USB stick without a filesystem UUID
+    usb_disk2 = USB_DISK.replace('sdb', 'sdc')
+    _write(sysfs / usb_disk2 / 'sdc1' / 'partition', '1\n')
+    for number, target in (('8:1', SATA_DISK + '/sda1'), ('8:17', USB_DISK + '/sdb1'),
+                           ('179:0', CARD_DISK), ('8:33', usb_disk2 + '/sdc1')):
+        _link(sysfs / 'dev' / 'block' / number, '../../' + target)
+
+    dev_disk = tmp_path / 'dev' / 'disk'
+    _link(dev_disk / 'by-label' / 'My\\x20Stick', '../../sdb1')
+    _link(dev_disk / 'by-uuid' / '1A2B-3C4D', '../../sdb1')
+    _link(dev_disk / 'by-uuid' / '0123456789ABCDEF', '../../mmcblk0')
+    _link(dev_disk / 'by-uuid' / '6f1e0c0a-0000-4000-8000-000000000000', '../../sda1')
+
+    mountinfo = tmp_path / 'mountinfo'
+    mountinfo.write_text(MOUNTINFO)
+    return LinuxBackend(str(sysfs), str(mountinfo), str(dev_disk))
+
+
+def test_scan_finds_only_removable_devices(backend):
+    devices = backend.scan_devices()
+    assert set(devices) == {'/media/user/My Stick', '/media/card', '/media/nolabel'}
+
+
+def test_scan_reads_label_serial_and_fs_type(backend):
+    devices = backend.scan_devices()
+    assert devices['/media/user/My Stick'] == DeviceInfo(
+        '/media/user/My Stick', '/dev/sdb1', 'My Stick', str(0x1A2B3C4D), 'vfat')
+    assert devices['/media/card'] == DeviceInfo(
+        '/media/card', '/dev/mmcblk0', '', str(0x89ABCDEF - (1 << 32)), 'exfat')
+    # No UUID: the serial of the USB device it hangs off
+    assert devices['/media/nolabel'].serial == 'AA0011223344'
+
+
+def test_device_id(backend):
+    assert backend.get_device_id('/media/user/My Stick') == f'My Stick_{0x1A2B3C4D}'
+    assert backend.get_device_id('/media/card/') == f'NoName_{0x89ABCDEF - (1 << 32)}'
+    assert backend.get_device_id('/home/user/some dir') == 'some dir'
+
+
+def test_missing_mount_table(tmp_path):
+    backend = LinuxBackend(str(tmp_path), str(tmp_path / 'missing'), str(tmp_path))
+    assert backend.scan_devices() == {}
+
+
+@pytest.mark.parametrize('raw, decoded', [
+    ('/media/My\\040Stick', '/media/My Stick'),
+    ('/media/tab\\011and\\012newline', '/media/tab\tand\nnewline'),
+    ('/media/back\\134slash', '/media/back\\slash'),
+    ('/media/plain', '/media/plain'),
+])
+def test_unescape_mountinfo(raw, decoded):
+    assert _unescape_mountinfo(raw) == decoded
+
+
+@pytest.mark.parametrize('raw, decoded', [
+    ('My\\x20Stick', 'My Stick'),
+    ('a\\x2fb', 'a/b'),
+    ('\\x5cx20', '\\x20'),
+    ('PLAIN', 'PLAIN'),
+])
+def test_unescape_udev(raw, decoded):
+    assert _unescape_udev(raw) == decoded
+
+
+@pytest.mark.parametrize('uuid, serial', [
+    ('1A2B-3C4D', str(0x1A2B3C4D)),
+    ('1a2b-3c4d', str(0x1A2B3C4D)),
+    # NTFS: Windows shows the low 32 bits
+    ('0123456789ABCDEF', str(0x89ABCDEF - (1 << 32))),
+    ('6f1e0c0a-0000-4000-8000-000000000000', '6f1e0c0a-0000-4000-8000-000000000000'),
+])
+def test_volume_serial(uuid, serial):
+    assert volume_serial(uuid) == serial
+
+
+def test_volume_serial_matches_windows():
+    # pywin32 returns serials with the high bit set as negative numbers,
+    # which Windows device IDs have always used as they are
+    signed = 0xF1A20304 - (1 << 32)
+    assert volume_serial('F1A2-0304') == str(signed) == format_serial(0xF1A20304)
+    assert volume_serial('0123456789ABCDEF') == str(0x89ABCDEF - (1 << 32))
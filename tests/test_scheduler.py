@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+from src.core.scheduler import BackupScheduler
+
+
+class BlockingCopier:
+    """Copier whose copy runs until it is stopped, and then a little longer"""
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.running = threading.Event()
+        self.finished = threading.Event()
+
+    def do_copy(self, drive, streams=None):
+        self.running.set()
+        self.stopped.wait(5)
+        # Closing the manifest and journal takes a moment
+        threading.Event().wait(0.2)
+        self.finished.set()
+        return True
+
+    def stop_current_copy(self):
+        self.stopped.set()
+
+
+def test_second_stop_waits_for_the_copy():
+    async def run():
+        scheduler = BackupScheduler(max_jobs=2)
+        scheduler.submit('/media/stick')
+        copier = scheduler._jobs['/media/stick'].copier = BlockingCopier()
+        await asyncio.get_running_loop().run_in_executor(None, copier.running.wait, 5)
+        # Device removed, then Stop clicked
+        scheduler.stop('/media/stick')
+        await asyncio.sleep(0)
+        scheduler.stop_all()
+        await scheduler.join()
+        assert copier.finished.is_set()
+        assert scheduler.active_jobs == 0
+        scheduler.close()
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from benchmarks.bench_startup import CHECKS, measure
+
+# Shared CI machines are slower than a desktop, raise the budgets there
+SCALE = float(os.environ.get('USBBACKUP_BUDGET_SCALE', '1.0'))
+
+
+def _check(name):
+    code, budget = CHECKS[name]
+    runs = [measure(code) for _ in range(3)]
+    assert not any(run['qt'] for run in runs), "PyQt was imported"
+    best = min(run['ms'] for run in runs)
+    assert best <= budget * SCALE, f"{name} took {best:.1f} ms, budget {budget * SCALE:.0f} ms"
+    return runs
+
+
+@pytest.mark.parametrize('name', ['import src.cli', 'cli --help'])
+def test_cli_stays_light(name):
+    runs = _check(name)
+    assert not any(run['core'] for run in runs), "src.core.config was imported"
+
+
+def test_core_stays_headless():
+    # What the backup and daemon commands load, without the tray
+    _check('import core')